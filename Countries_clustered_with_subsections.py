@@ -1,114 +1,71 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-
-# Load the data into a dataframe
-df = pd.read_csv('Infant nutrition data by country.csv')  
-
-# strip colums 
-df.columns = df.columns.str.strip()
-
-# Convert columns to numeric, handling errors
-df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
-df['Early initiation of breastfeeding (%)'] = pd.to_numeric(df['Early initiation of breastfeeding (%)'], errors='coerce')
-df['Infants exclusively breastfed for the first six months of life (%)'] = pd.to_numeric(df['Infants exclusively breastfed for the first six months of life (%)'], errors='coerce')
-
-# Define sub-region mapping to split up the data a bit better
-region_mapping = {
-    # Europe divided into sub-regions
-    'Western Europe': ['Austria', 'Belgium', 'France', 'Germany', 'Ireland', 'Luxembourg', 'Netherlands (Kingdom of the)', 'Switzerland', 'United Kingdom of Great Britain'],
-    'Eastern Europe': ['Armenia', 'Azerbaijan', 'Belarus', 'Bulgaria', 'Georgia', 'Kazakhstan', 'Kyrgyzstan', 'Republic of Moldova', 'Russian Federation', 'Tajikistan', 'Turkmenistan', 'Ukraine', 'Uzbekistan'],
-    'Northern Europe': ['Denmark', 'Estonia', 'Finland', 'Iceland', 'Latvia', 'Lithuania', 'Norway', 'Sweden'],
-    'Southern Europe': ['Albania', 'Andorra', 'Bosnia and Herzegovina', 'Croatia', 'Cyprus', 'Greece', 'Italy', 'Malta', 'Monaco', 'Montenegro', 'North Macedonia', 'Portugal', 'San Marino', 'Serbia', 'Slovenia', 'Spain', 'Turkey'],
-
-    # Americas divided into sub-regions
-    'North America': ['Canada', 'United States of America'],
-    'Central America and Caribbean': ['Bahamas', 'Barbados', 'Belize', 'Costa Rica', 'Cuba', 'Dominica', 'Dominican Republic', 'El Salvador', 'Grenada', 'Guatemala', 'Haiti', 'Honduras', 'Jamaica', 'Mexico', 'Nicaragua', 'Panama', 'Saint Kitts and Nevis', 'Saint Lucia', 'Saint Vincent and the Grenadines', 'Trinidad and Tobago'],
-    'South America': ['Argentina', 'Bolivia (Plurinational State of)', 'Brazil', 'Chile', 'Colombia', 'Ecuador', 'Guyana', 'Paraguay', 'Peru', 'Suriname', 'Uruguay', 'Venezuela (Bolivarian Republic of)'],
-
-    # Western-Pacific
-    'Western-Pacific': ['Australia', 'Brunei Darussalam', 'Cambodia', 'China', 'Cook Islands', 
-    'Fiji', 'Japan', 'Kiribati', "Lao People's Democratic Republic", 'Malaysia', 'Marshall Islands', 
-    'Micronesia (Federated States of)', 'Mongolia', 'Nauru', 'New Zealand', 'Niue', 'Palau', 'Papua New Guinea', 'Philippines', 
-    'Republic of Korea', 'Samoa', 'Singapore', 'Solomon Islands', 'Tonga', 'Tuvalu', 'Vanuatu', 'Viet Nam'],
-
-    # Eastern Mediterranean
-    'Eastern Mediterranean': ['Afghanistan', 'Bahrain', 'Djibouti', 'Egypt', 'Iran (Islamic Republic of)', 
-    'Iraq', 'Jordan', 'Kuwait', 'Lebanon', 'Libya', 'Morocco', 'occupied Palestinian territory, including east Jerusalem', 
-    'Oman', 'Pakistan', 'Qatar', 'Saudi Arabia', 'Somalia', 'Sudan', 'Syrian Arab Republic', 'Tunisia', 'United Arab Emirates', 
-    'Yemen'],
-
-    # South-East Asia
-    'South-East Asia': ['Bangladesh', 'Bhutan', "Democratic People's Republic of Korea", 'India', 'Indonesia', 'Maldives',
-    'Myanmar', 'Nepal', 'Sri Lanka', 'Thailand', 'Timor-Leste']
-}
-
-# Function to assign region based on country
-def get_region(country):
-    for region, countries in region_mapping.items():
-        if country in countries:
-            return region
-    return 'Other'  # If country doesn't fit in a defined region
-
-# Apply the region assignment to the DataFrame
-df['Region'] = df['Countries, territories and areas'].apply(get_region)
-
-# Filter out the 'Other' region if you don't want to include them in the plots
-df = df[df['Region'] != 'Other']
+from country_registry import SUBREGIONS, canonical_names, subregion_of
+from plot_rendering import figure_name, rendering_arguments, show_or_save
 
 # Set the consistent year range for all graphs
 year_range = (1980, 2025)
 
-# Get unique regions for plotting
-regions = df['Region'].unique()
+# Load the data into a dataframe, with the sub-region of every country
+def load_data(file_path='Infant nutrition data by country.csv'):
+    df = pd.read_csv(file_path)
 
-# Loop through each region and create two graphs for each (one for each indicator)
-for region in regions:
-    region_data = df[df['Region'] == region]
-    
-    # Plot Early Initiation of Breastfeeding (%)
-    plt.figure(figsize=(12, 8))
-    for country in region_mapping[region]:
-        country_data = region_data[region_data['Countries, territories and areas'] == country]
-        
-        # Filter valid year data to avoid issues
-        country_data = country_data[(country_data['Year'] >= year_range[0]) & (country_data['Year'] <= year_range[1])]
-        
-        # Ensure theres going to be data tp plot
-        if not country_data.empty:
-            plt.plot(country_data['Year'], country_data['Early initiation of breastfeeding (%)'],
-                     marker='o', label=f'{country} - Early initiation of breastfeeding')
+    # strip colums
+    df.columns = df.columns.str.strip()
 
-    # Add labels, title, consistent x-axis and y-axis range
-    plt.xlabel('Year')
-    plt.ylabel('Percentage')
-    plt.title(f'Early Initiation of Breastfeeding in {region} by Country and Year')
-    plt.xlim(year_range)  # Set x-axis to 1990-2020
-    plt.ylim(0, 100)      # Set y-axis to 0-100 for percentage
-    plt.legend(loc='best')
-    plt.grid(True)
-    plt.tight_layout()
-    plt.show()
+    # Convert columns to numeric, handling errors
+    df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+    df['Early initiation of breastfeeding (%)'] = pd.to_numeric(df['Early initiation of breastfeeding (%)'], errors='coerce')
+    df['Infants exclusively breastfed for the first six months of life (%)'] = pd.to_numeric(df['Infants exclusively breastfed for the first six months of life (%)'], errors='coerce')
+
+    # Sub-regions come from country_registry.py so every script groups the countries the same way,
+    # names are put into the WHO spelling first so they match the registry's lists
+    df['Countries, territories and areas'] = canonical_names(df['Countries, territories and areas'])
+    df['Region'] = subregion_of(df['Countries, territories and areas'])
+
+    # Only these sub-regions are plotted, Africa isn't part of this analysis
+    plotted_regions = [region for region in SUBREGIONS if region != 'Africa']
+    return df[df['Region'].isin(plotted_regions)]
 
-    # Plot Infants Exclusively Breastfed for the First Six Months (%)
-    plt.figure(figsize=(12, 8))
-    for country in region_mapping[region]:
-        country_data = region_data[region_data['Countries, territories and areas'] == country]
-        
-        # Filter valid year data to avoid issues
-        country_data = country_data[(country_data['Year'] >= year_range[0]) & (country_data['Year'] <= year_range[1])]
-        
-        # Ensure theres data available to plot
-        if not country_data.empty:
-            plt.plot(country_data['Year'], country_data['Infants exclusively breastfed for the first six months of life (%)'],
-                     marker='x', label=f'{country} - Infants exclusively breastfed')
+# One line per country of a sub-region, country_frames is a list of (country, that country's rows)
+def draw_region_countries(country_frames, column, marker, label, title):
+    figure = plt.figure(figsize=(12, 8))
+    for country, country_data in country_frames:
+        plt.plot(country_data['Year'], country_data[column], marker=marker, label=f'{country} - {label}')
 
     # Add labels, title, consistent x-axis and y-axis range
     plt.xlabel('Year')
     plt.ylabel('Percentage')
-    plt.title(f'Infants Exclusively Breastfed in {region} for the First Six Months by Country and Year')
+    plt.title(title)
     plt.xlim(year_range)  # Set x-axis to 1990-2020
     plt.ylim(0, 100)      # Set y-axis to 0-100 for percentage
     plt.legend(loc='best')
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    return figure
+
+# Two graphs for each sub-region (one for each indicator). The rows are split by country once up
+# front instead of filtering the whole frame again for every country of every graph
+def figure_jobs(df):
+    # Filter valid year data to avoid issues
+    df = df[(df['Year'] >= year_range[0]) & (df['Year'] <= year_range[1])]
+    by_country = dict(list(df.groupby('Countries, territories and areas', sort=False)))
+
+    jobs = []
+    for region in df['Region'].unique():
+        # Countries in the registry's order, ensure theres going to be data to plot
+        country_frames = [(country, by_country[country]) for country in SUBREGIONS[region] if country in by_country]
+        for column, marker, label, title in [
+            ('Early initiation of breastfeeding (%)', 'o', 'Early initiation of breastfeeding',
+             f'Early Initiation of Breastfeeding in {region} by Country and Year'),
+            ('Infants exclusively breastfed for the first six months of life (%)', 'x', 'Infants exclusively breastfed',
+             f'Infants Exclusively Breastfed in {region} for the First Six Months by Country and Year')]:
+            jobs.append((draw_region_countries, (country_frames, column, marker, label, title), figure_name(title)))
+    return jobs
+
+def main():
+    args = rendering_arguments('Breastfeeding indicators per country, grouped by sub-region').parse_args()
+    show_or_save(figure_jobs(load_data()), args.output_dir, args.formats, args.workers, args.dpi)
+
+if __name__ == "__main__":
+    main()
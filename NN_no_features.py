@@ -2,86 +2,86 @@
 but this file does NOT use any features.
 The reason for this is to compare the model with features results vs. this one without"""
 
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.neural_network import MLPRegressor
 from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.impute import KNNImputer
+from country_encoding import COUNTRY_COL
+from NN_with_features import TARGET, check_countries, example_country
+from model_backends import MODEL_BACKENDS, MODEL_LABELS, parse_model_params, train_model
+from preprocessing import Preprocessor
+from stage_telemetry import stage_telemetry
 
-df = pd.read_csv('cleaned_data.csv')
+# Which model to train, the neural network unless another backend is picked (see model_backends.py)
+parser = argparse.ArgumentParser(description='Train and test a model on every column of cleaned_data.csv')
+parser.add_argument('--model', choices=list(MODEL_BACKENDS), default='mlp')
+parser.add_argument('--model-params', metavar='JSON', help='settings for the model, e.g. \'{"alpha": 0.1}\'')
+parser.add_argument('--country', default='Afghanistan', help='country of the example prediction')
+parser.add_argument('--year', type=int, default=2015, help='year of the example prediction')
+args = parser.parse_args()
 
-# Create dummy variables for categorical features, in this case coutnires territories and areas
-df_encoded = pd.get_dummies(df, columns=['Countries, territories and areas'])
+df = pd.read_csv('cleaned_data.csv')
 
 """Prepare X and Y, we use .drop here to drop the target in the X variable as this is the 
 simplest and most effective method for using a no feature selection model. This means that all
 variables will be included except for the target variable """
-target = 'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Both sexes'
-X = df_encoded.drop(columns=[target])
-y = df_encoded[target]
+target = TARGET
+X = df.drop(columns=[target])
+y = df[target]
+features = [col for col in X.columns if col != COUNTRY_COL]
 
-# Handle missing values using KNN Imputation
-knn_imputer = KNNImputer(n_neighbors=10)
-X_imputed = pd.DataFrame(knn_imputer.fit_transform(X), columns=X.columns)
-y_imputed = pd.Series(knn_imputer.fit_transform(y.values.reshape(-1, 1)).flatten(), name=y.name)
+# Split the data into training and testing sets
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=50)
 
-# Save the imputed dataset to a CSV file for inspection, not neccessary but I was interested in how it changes
-imputed_data = pd.concat([X_imputed, y_imputed], axis=1)
-imputed_data.to_csv('imputed_knn_data.csv', index=False)
+# Handle missing values using KNN Imputation (country by country over the numeric columns, see
+# knn_imputation.py), then one-hot encode the countries and scale. The preprocessor is fitted on the
+# training rows only and the test rows just go through it (see preprocessing.py)
+preprocessor = Preprocessor(features, encoding='onehot', n_neighbors=10)
+with stage_telemetry('impute_knn_no_features', X_train) as telemetry:
+    X_train_imputed = telemetry.output(preprocessor.fit_impute(X_train, y_train))
+X_test_imputed = preprocessor.impute(X_test)
+y_train, y_test = preprocessor.impute_target(y_train), preprocessor.impute_target(y_test)
 
-# Split the data into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X_imputed, y_imputed, test_size=0.2, random_state=50)
+# Save the imputed dataset to a CSV file for inspection, not neccessary but I was interested in how it changes
+imputed_data = pd.concat([pd.concat([X_train_imputed, X_test_imputed]),
+                          pd.concat([y_train, y_test])], axis=1).sort_index()
+imputed_data.to_csv('imputed_knn_data_no_features.csv', index=False)  # Its own file, NN_with_features.py writes imputed_knn_data.csv
 
 # Scale the features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
+X_train_scaled = preprocessor.encode(X_train_imputed)
+X_test_scaled = preprocessor.encode(X_test_imputed)
 
-# Neural Network Model
-nn_model = MLPRegressor(hidden_layer_sizes=(100, 50), max_iter=1000, random_state=50)
-nn_model.fit(X_train_scaled, y_train)
+# Neural Network Model (MLPRegressor with hidden layers (100, 50) by default)
+with stage_telemetry('train_no_features', X_train_scaled) as telemetry:
+    telemetry.note(model=args.model)
+    nn_model = train_model(args.model, X_train_scaled, y_train, **parse_model_params(args.model_params))
 nn_predictions = nn_model.predict(X_test_scaled)
 
 #print results in the terminal for evaluation
-print("\nNeural Network Results (with KNN Imputation):")
+print(f"\n{MODEL_LABELS[args.model]} Results (with KNN Imputation):")
 print(f"MSE: {mean_squared_error(y_test, nn_predictions):.4f}")
 print(f"R^2: {r2_score(y_test, nn_predictions):.4f}")
 
+# Function to predict mortality rates for many countries and years with one encode and one predict call,
+# like predict_mortality_rate below only the year and the country are filled in (every other column is 0).
+# Unknown countries raise a KeyError like in NN_with_features.py
+def predict_mortality_rates(countries, years, model, preprocessor):
+    inputs = pd.DataFrame(0.0, index=np.arange(len(years)), columns=preprocessor.features)
+    inputs['Year'] = years
+    inputs[COUNTRY_COL] = check_countries(countries, preprocessor.categories_)
+    return model.predict(preprocessor.encode(inputs))
+
 # Function to predict mortality rate for a specific country and year
-def predict_mortality_rate(country, year, model, imputed_data):
-    country_col = f'Countries, territories and areas_{country}'
-    
-    # Select the country data
-    country_data = imputed_data[(imputed_data['Year'] == year) & (imputed_data[country_col] == 1)]
-    
-    # Prepare the input dictionary with just the year and country
-    input_data = {'Year': [year]}
-    
-    # Create one-hot encoded country columns
-    for col in X.columns:
-        if col.startswith('Countries, territories and areas_'):
-            input_data[col] = [1 if col == country_col else 0]
-    
-    # Create DataFrame and reindex
-    input_df = pd.DataFrame(input_data)
-    input_df = input_df.reindex(columns=X.columns, fill_value=0)
-    
-    # Scale the input data
-    input_data_scaled = scaler.transform(input_df)
-    
-    # Make prediction
-    prediction = model.predict(input_data_scaled)
-    
-    return prediction[0]
+def predict_mortality_rate(country, year, model, preprocessor):
+    return predict_mortality_rates([country], [year], model, preprocessor)[0]
 
-# Example usage with fully imputed data for further testing
-country = "Afghanistan"
-year = 2015
+# Example usage with fully imputed data for further testing (another country if there's no Afghanistan in the data)
+country = example_country(args.country, preprocessor.categories_)
+year = args.year
 
-nn_prediction = predict_mortality_rate(country, year, nn_model, imputed_data)
+nn_prediction = predict_mortality_rate(country, year, nn_model, preprocessor)
 
 #Print results for specific country in specific year for evaluation
 print(f"\nPredicted mortality rate for {country} in {year}:")
-print(f"Neural Network (KNN Imputation): {nn_prediction:.2f}")
\ No newline at end of file
+print(f"{MODEL_LABELS[args.model]} (KNN Imputation): {nn_prediction:.2f}")
\ No newline at end of file
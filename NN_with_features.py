@@ -1,20 +1,40 @@
 """This file first imputes missing values with KNN imputation, then trains and tests
-a neural network 
+a neural network. Pass --encoding sparse to keep countries as codes and feed them to the
+model as a sparse one-hot block instead of ~200 dense dummy columns (see country_encoding.py).
+Pass --all-targets to train one model for every mortality rate and death count column at once,
+instead of only the under-five mortality rate (both sexes)
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
 from sklearn.neural_network import MLPRegressor
 from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.impute import KNNImputer
+from model_backends import MODEL_BACKENDS, MODEL_LABELS, parse_model_params, train_model
+from compact_dtypes import memory_report, print_memory_report, read_compact_csv
+from country_encoding import COUNTRY_COL, country_codes
+from country_registry import canonical_names
+from preprocessing import Preprocessor
+from stage_telemetry import stage_telemetry
 
 """ Function to load and preprocess data from our data file
-'features' are the input columns, 'target' is the column we want to predict"""
+'features' are the input columns, 'target' is the column we want to predict (or a list of columns, then y is a frame).
+encoding='sparse' keeps the country as a single categorical column instead of one-hot encoding it,
+compact=True reads only these columns as float32, int16 years and a categorical country (see compact_dtypes.py)"""
 
-def load_and_prepare_data(file_path, features, target):
-    df = pd.read_csv(file_path)  # Load data from CSV file
+def load_and_prepare_data(file_path, features, target, encoding='onehot', compact=False):
+    if compact:
+        targets = target if isinstance(target, list) else [target]
+        df = read_compact_csv(file_path, usecols=features + [COUNTRY_COL] + targets)
+    else:
+        df = pd.read_csv(file_path)  # Load data from CSV file
+    if encoding == 'sparse':
+        # The country only gets expanded (sparsely) when the design matrix is built for the model
+        X = df[features + [COUNTRY_COL]].astype({COUNTRY_COL: 'category'})
+        return X, df[target]
+    if encoding != 'onehot':
+        raise ValueError(f"Unknown country encoding '{encoding}'")
     # Convert categorical 'Countries, territories and areas' column using one-hot encoding
     df_encoded = pd.get_dummies(df, columns=['Countries, territories and areas'])  
     # Extract input features (X) and target variable (y)
@@ -22,17 +42,6 @@ def load_and_prepare_data(file_path, features, target):
     y = df_encoded[target]
     return X, y
 
-""" Function to handle missing values using KNN imputation
-The KNNImputer will fill missing values by averaging the values of the 10 nearest neighbour data points"""
-
-def impute_missing_values(X, y, n_neighbors=10):
-    knn_imputer = KNNImputer(n_neighbors=n_neighbors)  # Initialize KNN imputer with 10 neighbours as best results
-    # Fit and transform the input feature matrix (X) and target (y) to fill missing values
-    X_imputed = pd.DataFrame(knn_imputer.fit_transform(X), columns=X.columns)
-    # Impute target values (y) separately and return it as a Series
-    y_imputed = pd.Series(knn_imputer.fit_transform(y.values.reshape(-1, 1)).flatten(), name=y.name)
-    return X_imputed, y_imputed
-
 """ Function to define and train the neural network model
 'hidden_layers' specifies the number of neurons in each hidden layer
 'max_iter' is the maximum number of training iterations"""
@@ -43,99 +52,228 @@ def train_neural_network(X_train, y_train, hidden_layers=(100, 50), max_iter=100
     nn_model.fit(X_train, y_train)  # Train the neural network model on the training data
     return nn_model
 
+""" Function to predict with a trained model. Mortality rates and death counts can't be negative,
+but nothing stops the model's output going below zero (e.g. deaths in a small country), so those are clipped to 0"""
+
+def predict_nonnegative(model, X):
+    return np.maximum(model.predict(X), 0)
+
+""" Function to find the rows that have a value for every target. Only these are trained and scored on,
+a missing target isn't filled in, a made-up label would just be learnt as if it was real"""
+
+def observed_rows(y):
+    return y.notna().to_numpy().reshape(len(y), -1).all(axis=1)
+
 """ Function to evaluate the trained neural network model on test data
 It uses Mean Squared Error and R^2 as evaluation metrics"""
 
 def evaluate_model(model, X_test, y_test):
-    predictions = model.predict(X_test)  # Predict target values for the test set
+    predictions = predict_nonnegative(model, X_test)  # Predict target values for the test set
     mse = mean_squared_error(y_test, predictions)  # Calculate MSE to measure average prediction error
     r2 = r2_score(y_test, predictions)  # Calculate R^2 to measure goodness-of-fit
     return mse, r2
 
+""" Function to evaluate a model with several targets, MSE and R^2 for each target column from one predict call"""
+
+def evaluate_targets(model, X_test, y_test):
+    predictions = predict_nonnegative(model, X_test)
+    scores = {}
+    for i, column in enumerate(y_test.columns):
+        scores[column] = {'MSE': mean_squared_error(y_test[column], predictions[:, i]),
+                          'R^2': r2_score(y_test[column], predictions[:, i])}
+    return pd.DataFrame(scores).T
+
+EARLY_COL = 'Early initiation of breastfeeding (%)'
+EXCLUSIVE_COL = 'Infants exclusively breastfed for the first six months of life (%)'
+
+# The model's input columns and the column it predicts by default, every other script imports these from here
+FEATURES = ['Year', EARLY_COL, EXCLUSIVE_COL]
+TARGET = 'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Both sexes'
+
+# Every mortality rate and death count column in cleaned_data.csv, what --all-targets predicts
+MORTALITY_TARGETS = [
+    TARGET,
+    'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Male',
+    'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Female',
+    'Number of deaths among children under-five Both sexes',
+    'Number of deaths among children under-five Male',
+    'Number of deaths among children under-five Female',
+]
+# The death counts among them, learnt as log(1 + count) by the --all-targets model (see model_backends.py)
+DEATH_COUNT_TARGETS = MORTALITY_TARGETS[3:]
+
+""" Function to index the imputed breastfeeding values by (country, year) once, so predictions
+look them up directly instead of scanning the whole imputed frame for every query.
+'imputed_data' has the country names in the 'Countries, territories and areas' column"""
+
+def build_feature_lookup(imputed_data):
+    countries = imputed_data[COUNTRY_COL].astype(str).to_numpy()
+    index = pd.MultiIndex.from_arrays([countries, imputed_data['Year'].astype(int).to_numpy()])
+    lookup = pd.DataFrame(imputed_data[[EARLY_COL, EXCLUSIVE_COL]].to_numpy(), index=index,
+                          columns=[EARLY_COL, EXCLUSIVE_COL])
+    return lookup[~lookup.index.duplicated()]
+
+""" Function to put country names into the WHO spelling and make sure the model knows every one of them"""
+
+def check_countries(countries, categories):
+    countries = canonical_names(pd.Series(np.asarray(countries, dtype=object).astype(str))).to_numpy(dtype=object)
+    unknown = country_codes(pd.Series(countries), categories) < 0
+    if unknown.any():
+        raise KeyError(f'Unknown countries: {sorted(set(countries[unknown]))}')
+    return countries
+
+""" Function to pick the country for the example prediction at the end of a run: the one asked for if the
+model was trained on it, otherwise the first country it knows (e.g. synthetic data has no Afghanistan)"""
+
+def example_country(country, categories):
+    name = canonical_names(pd.Series([country], dtype=object))[0]
+    if name in set(categories):
+        return name
+    print(f"\n{country} is not in the training data, the example prediction uses {categories[0]} instead")
+    return categories[0]
+
+""" Function to predict under-five mortality rate for many (country, year) pairs in one go.
+The breastfeeding values come from the lookup; pairs that aren't in it use breastfeeding_early and
+breastfeeding_exclusive instead (a single value or one per pair). With override=True those values
+are used for every pair, e.g. for "what if" questions. Anything still missing is imputed by the
+fitted preprocessor, which also encodes and scales everything for one predict call.
+A multi-target model (--all-targets) gives one column per target, all from the same call.
+Country names go through country_registry.py first ('Turkey' -> 'Turkiye'), a country the model
+wasn't trained on raises a KeyError instead of getting a prediction with no country at all.
+Predictions below zero come back as 0"""
+
+def predict_mortality_rates(countries, years, model, preprocessor, lookup, breastfeeding_early=np.nan,
+                            breastfeeding_exclusive=np.nan, override=False):
+    countries = check_countries(countries, preprocessor.categories_)
+    years = np.asarray(years, dtype=int)
+    early = np.broadcast_to(np.asarray(breastfeeding_early, dtype=float), years.shape).copy()
+    exclusive = np.broadcast_to(np.asarray(breastfeeding_exclusive, dtype=float), years.shape).copy()
+
+    # If breastfeeding data for the country and year exists, use it; otherwise, use the given values
+    if not override:
+        positions = lookup.index.get_indexer(pd.MultiIndex.from_arrays([countries, years]))
+        found = positions >= 0
+        early[found] = lookup[EARLY_COL].to_numpy()[positions[found]]
+        exclusive[found] = lookup[EXCLUSIVE_COL].to_numpy()[positions[found]]
+
+    input_df = pd.DataFrame({'Year': years, EARLY_COL: early, EXCLUSIVE_COL: exclusive, COUNTRY_COL: countries})
+    return predict_nonnegative(model, preprocessor.transform(input_df))
+
 """ Function to predict under-five mortality rate for a specific country and year
-Uses the trained neural network model and the now fully imputed data for prediction"""
+Uses the trained neural network model, its fitted preprocessor and the lookup of imputed values.
+This is just predict_mortality_rates for one pair, use that directly for lots of predictions
+(for a multi-target model this is an array with a value per target)"""
 
-def predict_country_mortality_rate(country, year, default_breastfeeding_early, default_breastfeeding_exclusive, model, scaler, X_columns, imputed_data):
-    # Construct the one-hot encoded column name for the specified country
-    country_col = f'Countries, territories and areas_{country}'
-    
-    # Search for data corresponding to the given country and year in the imputed data
-    country_data = imputed_data[(imputed_data['Year'] == year) & (imputed_data[country_col] == 1)]
-    
-    # If breastfeeding data for the country and year exists, use it; otherwise, use default breastfeeding values
-    if not country_data.empty:
-        breastfeeding_early = country_data['Early initiation of breastfeeding (%)'].values[0]
-        breastfeeding_exclusive = country_data['Infants exclusively breastfed for the first six months of life (%)'].values[0]
-    else:
-        breastfeeding_early = default_breastfeeding_early
-        breastfeeding_exclusive = default_breastfeeding_exclusive
-    
-    # Create a dictionary of input features for prediction
-    input_data = {
-        'Year': [year],
-        'Early initiation of breastfeeding (%)': [breastfeeding_early],
-        'Infants exclusively breastfed for the first six months of life (%)': [breastfeeding_exclusive]
-    }
-    
-    # Add country one-hot encoded columns (set the specified country column to 1, and others to 0)
-    for col in X_columns:
-        if col.startswith('Countries, territories and areas_'):
-            input_data[col] = [1 if col == country_col else 0]
-    
-    # Convert the input data dictionary to a DataFrame and reorder columns to match the training data
-    input_df = pd.DataFrame(input_data)
-    input_df = input_df.reindex(columns=X_columns, fill_value=0)
-    
-    # Scale the input data using the same scaler used for training
-    input_data_scaled = scaler.transform(input_df)
-    # Predict the mortality rate using the neural network model
-    prediction = model.predict(input_data_scaled)
-    
+def predict_country_mortality_rate(country, year, default_breastfeeding_early, default_breastfeeding_exclusive, model, preprocessor, lookup):
+    prediction = predict_mortality_rates([country], [year], model, preprocessor, lookup,
+                                         default_breastfeeding_early, default_breastfeeding_exclusive)
     return prediction[0]  # Return the predicted value
 
 """Main execution of the file is here, I have used functions throughout this programme although
 that is not necessary, given the fact that this code is unlikely to be reused.."""
 if __name__ == "__main__":
-    features = ['Year', 'Early initiation of breastfeeding (%)', 
-                'Infants exclusively breastfed for the first six months of life (%)']
-    target = 'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Both sexes'
+    parser = argparse.ArgumentParser(description='Impute cleaned_data.csv, then train and test the neural network')
+    parser.add_argument('--encoding', choices=['onehot', 'sparse'], default='onehot',
+                        help='dense one-hot country columns, or country codes expanded to a sparse block')
+    parser.add_argument('--save-bundle', metavar='DIR',
+                        help='save the trained model and lookup tables for prediction_server.py')
+    parser.add_argument('--model', choices=list(MODEL_BACKENDS), default='mlp',
+                        help='which model to train (see model_backends.py)')
+    parser.add_argument('--model-params', metavar='JSON', help='settings for the model, e.g. \'{"alpha": 0.1}\'')
+    parser.add_argument('--compact', action='store_true',
+                        help='float32 values, int16 years and categorical countries, prints the memory saved per stage')
+    parser.add_argument('--all-targets', action='store_true',
+                        help='one model for all six mortality rate and death count columns instead of just the under-five rate')
+    parser.add_argument('--country', default='Afghanistan', help='country of the example prediction')
+    parser.add_argument('--year', type=int, default=2015, help='year of the example prediction')
+    args = parser.parse_args()
+
+    features = FEATURES
+    target = MORTALITY_TARGETS if args.all_targets else TARGET
+
+    n_neighbors = 10
+
+    # Countries stay as names here, the preprocessor does the encoding
+    X, y = load_and_prepare_data('cleaned_data.csv', features, target, encoding='sparse', compact=args.compact)
 
-    X, y = load_and_prepare_data('cleaned_data.csv', features, target)
+    # Split the dataset into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=50)
 
-    X_imputed, y_imputed = impute_missing_values(X, y)
+    # Imputation, scaling and the column layout are fitted once on the training rows only (see
+    # preprocessing.py), the test rows and every prediction after that just go through transform
+    with stage_telemetry('fit_preprocessor', X_train) as telemetry:
+        telemetry.note(n_neighbors=n_neighbors, encoding=args.encoding)
+        preprocessor = Preprocessor(features, encoding=args.encoding, n_neighbors=n_neighbors, compact=args.compact)
+        X_train_imputed = telemetry.output(preprocessor.fit_impute(X_train, y_train))
+    X_test_imputed = preprocessor.impute(X_test)
+    X_train_scaled = preprocessor.encode(X_train_imputed)
+    X_test_scaled = preprocessor.encode(X_test_imputed)
 
     """Save the imputed dataset to a CSV file for future use and inspection
     this is not really needed but good for me to see how the imputation affects the data"""
 
-    imputed_data = pd.concat([X_imputed, y_imputed], axis=1)
+    imputed_data = pd.concat([pd.concat([X_train_imputed, X_test_imputed]),
+                              pd.concat([y_train, y_test])], axis=1).sort_index()
     imputed_data.to_csv('imputed_knn_data.csv', index=False)
 
-    # Split the dataset into training and testing sets 
-    X_train, X_test, y_train, y_test = train_test_split(X_imputed, y_imputed, test_size=0.2, random_state=50)
+    # The model only learns from and is scored on rows that have every target (with --all-targets the death
+    # counts are missing for about a tenth of the country-years). Those rows are still in the imputed file
+    # above, their features help impute the other rows, but their missing targets are left empty
+    train_rows, test_rows = observed_rows(y_train), observed_rows(y_test)
+    X_train_scaled, y_train = X_train_scaled[train_rows], y_train[train_rows]
+    X_test_scaled, y_test = X_test_scaled[test_rows], y_test[test_rows]
 
-    # Normalise the features using StandardScaler 
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    with stage_telemetry('train_neural_network', X_train_scaled) as telemetry:
+        # 'mlp' with no settings is the same network train_neural_network builds
+        log_targets = [target.index(column) for column in DEATH_COUNT_TARGETS] if args.all_targets else []
+        nn_model = train_model(args.model, X_train_scaled, y_train, log_targets,
+                               **parse_model_params(args.model_params))
+        telemetry.note(model=args.model, iterations=getattr(nn_model, 'n_iter_', None))
 
-    nn_model = train_neural_network(X_train_scaled, y_train)
+    # What each stage's data takes against the same data with the default dtypes
+    if args.compact:
+        print_memory_report([memory_report('load', X), memory_report('impute (train)', X_train_imputed),
+                             memory_report('design matrix (train)', X_train_scaled),
+                             memory_report('design matrix (test)', X_test_scaled)])
 
     """ Evaluate the trained model on the test data and print performance metrics
     Print the values for me to see in the terminal to check it worked"""
-    mse, r2 = evaluate_model(nn_model, X_test_scaled, y_test)
-    print("\nNeural Network Results (with KNN Imputation):")
-    print(f"MSE: {mse:.4f}")
-    print(f"R^2: {r2:.4f}")
+    print(f"\n{MODEL_LABELS[args.model]} Results (with KNN Imputation):")
+    if args.all_targets:
+        with pd.option_context('display.width', 200, 'display.float_format', '{:.4f}'.format):
+            print(evaluate_targets(nn_model, X_test_scaled, y_test))
+    else:
+        mse, r2 = evaluate_model(nn_model, X_test_scaled, y_test)
+        print(f"MSE: {mse:.4f}")
+        print(f"R^2: {r2:.4f}")
     
     # Example prediction for a specific country and year for further testing
-    country = "Afghanistan"
-    year = 2015
+    country = example_country(args.country, preprocessor.categories_)
+    year = args.year
     breastfeeding_early = 60  # Default value if early initiation breastfeeidng data is not available
     breastfeeding_exclusive = 50  # Default value if infants exclusively breastfeeding data is not available
 
     # Predict under-five mortality rate for the specified country and year
-    prediction = predict_country_mortality_rate(country, year, breastfeeding_early, breastfeeding_exclusive, nn_model, scaler, X.columns, imputed_data)
+    lookup = build_feature_lookup(imputed_data)
+    prediction = predict_country_mortality_rate(country, year, breastfeeding_early, breastfeeding_exclusive, nn_model, preprocessor, lookup)
     
     #Print the predicted mortality rate for me to see in terminal
     print(f"\nPredicted mortality rate for {country} in {year}:")
-    print(f"Neural Network (KNN Imputation): {prediction:.2f}")
+    if args.all_targets:
+        for column, value in zip(target, prediction):
+            print(f"{column}: {value:.2f}")
+    else:
+        print(f"{MODEL_LABELS[args.model]} (KNN Imputation): {prediction:.2f}")
+
+    # Every country for every year in the data, scored with one batch call
+    all_countries, all_years = lookup.index.get_level_values(0), lookup.index.get_level_values(1)
+    with stage_telemetry('predict_batch', len(lookup)) as telemetry:
+        all_predictions = telemetry.output(predict_mortality_rates(
+            all_countries, all_years, nn_model, preprocessor, lookup, breastfeeding_early, breastfeeding_exclusive))
+    print(f"\nBatch predictions made for {len(all_predictions)} country-years")
+
+    if args.save_bundle:
+        from model_bundle import save_bundle
+        save_bundle(args.save_bundle, nn_model, preprocessor, lookup, features, target,
+                    {EARLY_COL: breastfeeding_early, EXCLUSIVE_COL: breastfeeding_exclusive})
+        print(f"Model bundle saved to '{args.save_bundle}'")
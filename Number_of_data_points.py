@@ -1,12 +1,23 @@
+import argparse
+import os
 import pandas as pd
+from coverage_index import COUNTRY_COL, build_coverage_index
 
-# Define the path to your CSV file
-file_path = 'merged_data.csv'
+def main():
+    parser = argparse.ArgumentParser(description='Number of data points (non-null indicator values) in the merged file')
+    # Define the path to your CSV file
+    parser.add_argument('--data', default=os.path.join(os.environ.get('AAI_DATA_DIR', '.'), 'merged_data.csv'))
+    args = parser.parse_args()
 
-# Load the dataset
-data = pd.read_csv(file_path)
+    # Load the dataset, the country and year columns are labels rather than data points
+    data = pd.read_csv(args.data, dtype={COUNTRY_COL: 'string', 'Year': 'string'})
+    index = build_coverage_index({'merged': data})
 
-# Count the number of non-null data points
-total_data_points = data.size  # The total number of cells in the DataFrame
+    # Count the number of non-null data points, data.size would count the empty cells too
+    counts = pd.Series(index['non_null'], index=index['indicators'])
+    with pd.option_context('display.max_colwidth', 80):
+        print(counts.to_string())
+    print(f"Total number of data points: {counts.sum()} (of {data.size} cells)")
 
-print(f"Total number of data points: {total_data_points}")
+if __name__ == "__main__":
+    main()
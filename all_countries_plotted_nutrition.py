@@ -1,63 +1,59 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from plot_rendering import rendering_arguments, show_or_save
 
 # Load the CSV file into a DataFrame
-df = pd.read_csv('Infant nutrition data by country.csv')  # Replace with your file path
-
-# Clean column names (remove leading/trailing spaces)
-df.columns = df.columns.str.strip()
-
-# Convert columns to numeric, handling errors
-df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
-df['Early initiation of breastfeeding (%)'] = pd.to_numeric(df['Early initiation of breastfeeding (%)'], errors='coerce')
-df['Infants exclusively breastfed for the first six months of life (%)'] = pd.to_numeric(df['Infants exclusively breastfed for the first six months of life (%)'], errors='coerce')
-
-# Print data types to confirm conversion
-print(df.dtypes)
-
-# Get a list of unique countries for plotting
-countries = df['Countries, territories and areas'].unique()
-
-# Plot Early initiation of breastfeeding (%)
-plt.figure(figsize=(12, 8))
-
-for country in countries:
-    # Filter data for the current country
-    country_data = df[df['Countries, territories and areas'] == country]
-    
-    # Plot Early initiation of breastfeeding vs. Year
-    plt.plot(country_data['Year'], country_data['Early initiation of breastfeeding (%)'],
-             marker='o', label=f'{country} - Early initiation of breastfeeding')
-
-# Add labels and title
-plt.xlabel('Year')
-plt.ylabel('Percentage')
-plt.title('Early Initiation of Breastfeeding by Country and Year')
-plt.legend(loc='best')
-plt.grid(True)
-
-# Show the plot
-plt.tight_layout()
-plt.show()
-
-# Plot Infants exclusively breastfed (%)
-plt.figure(figsize=(12, 8))
-
-for country in countries:
-    # Filter data for the current country
-    country_data = df[df['Countries, territories and areas'] == country]
-    
-    # Plot Infants exclusively breastfed vs. Year
-    plt.plot(country_data['Year'], country_data['Infants exclusively breastfed for the first six months of life (%)'],
-             marker='x', label=f'{country} - Infants exclusively breastfed')
-
-# Add labels and title
-plt.xlabel('Year')
-plt.ylabel('Percentage')
-plt.title('Infants Exclusively Breastfed for the First Six Months by Country and Year')
-plt.legend(loc='best')
-plt.grid(True)
-
-# Show the plot
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+def load_data(file_path='Infant nutrition data by country.csv'):  # Replace with your file path
+    df = pd.read_csv(file_path)
+
+    # Clean column names (remove leading/trailing spaces)
+    df.columns = df.columns.str.strip()
+
+    # Convert columns to numeric, handling errors
+    df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+    df['Early initiation of breastfeeding (%)'] = pd.to_numeric(df['Early initiation of breastfeeding (%)'], errors='coerce')
+    df['Infants exclusively breastfed for the first six months of life (%)'] = pd.to_numeric(df['Infants exclusively breastfed for the first six months of life (%)'], errors='coerce')
+    return df
+
+# One line per country, country_frames is a list of (country, that country's rows)
+def draw_all_countries(country_frames, column, marker, label, title):
+    figure = plt.figure(figsize=(12, 8))
+
+    for country, country_data in country_frames:
+        # Plot the indicator vs. Year
+        plt.plot(country_data['Year'], country_data[column], marker=marker, label=f'{country} - {label}')
+
+    # Add labels and title
+    plt.xlabel('Year')
+    plt.ylabel('Percentage')
+    plt.title(title)
+    plt.legend(loc='best')
+    plt.grid(True)
+    plt.tight_layout()
+    return figure
+
+# The data is split by country once and both graphs use the same split
+def figure_jobs(df):
+    country_frames = list(df.groupby('Countries, territories and areas', sort=False))
+    return [
+        (draw_all_countries, (country_frames, 'Early initiation of breastfeeding (%)', 'o',
+                              'Early initiation of breastfeeding',
+                              'Early Initiation of Breastfeeding by Country and Year'),
+         'early_initiation_of_breastfeeding_by_country_and_year'),
+        (draw_all_countries, (country_frames, 'Infants exclusively breastfed for the first six months of life (%)', 'x',
+                              'Infants exclusively breastfed',
+                              'Infants Exclusively Breastfed for the First Six Months by Country and Year'),
+         'infants_exclusively_breastfed_by_country_and_year'),
+    ]
+
+def main():
+    args = rendering_arguments('Breastfeeding indicators for every country').parse_args()
+    df = load_data()
+
+    # Print data types to confirm conversion
+    print(df.dtypes)
+
+    show_or_save(figure_jobs(df), args.output_dir, args.formats, args.workers, args.dpi)
+
+if __name__ == "__main__":
+    main()
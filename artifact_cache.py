@@ -0,0 +1,62 @@
+"""Small cache for the output of each pipeline stage. A stage's output is saved as parquet
+under a key made from the stage name, the bytes of its input files, its parameters
+(e.g. n_neighbors for the KNN imputation) and the source of the code that produces it, so
+re-running a script after an unrelated change just loads the saved frame instead of redoing
+the work. Change an input, a parameter or the parsing/merging code and the key changes with it,
+so there's nothing to invalidate by hand."""
+
+import hashlib
+import inspect
+import json
+import os
+from typing import Callable, Dict, List, Union
+
+import pandas as pd
+
+CACHE_DIR = '.artifact_cache'
+
+# Hash a file in chunks so big inputs don't have to fit in memory
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Source files of the functions (or modules) that produce a stage's output, each file once. Code with
+# no file behind it (typed into python -c or a notebook) is left out
+def source_files(code: List) -> List[str]:
+    paths = {inspect.getsourcefile(item) for item in code}
+    return sorted(path for path in paths if path and os.path.isfile(path))
+
+# Key for one run of a stage, parameters go through json with sorted keys so dict order doesn't matter.
+# 'code' is the functions the output comes from, their source files are hashed in as well
+def stage_key(stage: str, inputs: List[str], params: Union[Dict, None] = None, code: Union[List, None] = None) -> str:
+    digest = hashlib.sha256(stage.encode())
+    for path in inputs:
+        digest.update(hash_file(path).encode())
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    for path in source_files(code or []):
+        digest.update(hash_file(path).encode())
+    return digest.hexdigest()[:24]
+
+# Where the output of a stage run lives
+def artifact_path(stage: str, key: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, f'{stage}-{key}.parquet')
+
+# Load a stage's output from the cache, or compute it and save it for next time. Without 'code' only
+# the file compute is defined in counts as the stage's code, list the helpers it calls from other files too
+def cached_stage(stage: str, inputs: List[str], params: Union[Dict, None],
+                 compute: Callable[[], pd.DataFrame], cache_dir: str = CACHE_DIR,
+                 code: Union[List, None] = None) -> pd.DataFrame:
+    path = artifact_path(stage, stage_key(stage, inputs, params, [compute] if code is None else code), cache_dir)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    df = compute().reset_index(drop=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so a half written artifact is never picked up
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return df
@@ -0,0 +1,176 @@
+"""Benchmarks for every stage of the pipeline at bigger and bigger data sizes. The WHO files
+are scaled up by copying every country under a new name (so each country keeps a realistic
+number of years), then each stage is timed and its peak memory is taken from tracemalloc.
+Every result is appended to benchmark_history.jsonl together with the git commit, so runs
+on different commits can be compared, and the table printed at the end shows the change
+against the last recorded run of the same stage and scale.
+
+    python benchmark_pipeline.py --scales 1 10 100"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from country_encoding import COUNTRY_COL
+from hill_climbing import align_data
+from load_who_exports import NUTRITION_FILE, load_regional_files, read_nutrition_file
+from merge_mortality_and_nutrition import merge_mortality_and_nutrition
+from NN_with_features import (FEATURES, TARGET, build_feature_lookup, load_and_prepare_data,
+                              predict_country_mortality_rate, predict_mortality_rates, train_neural_network)
+from preprocessing import Preprocessor
+
+HISTORY_FILE = 'benchmark_history.jsonl'
+
+# Copy every country 'factor' times, copy i of a country is renamed "<country> (i)"
+def scale_frame(df: pd.DataFrame, factor: int) -> pd.DataFrame:
+    if factor == 1:
+        return df
+    copies = []
+    for i in range(factor):
+        copy = df.copy()
+        if i:
+            copy[COUNTRY_COL] = copy[COUNTRY_COL] + f' ({i})'
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+# Set from --skip-memory, tracing memory means running every stage a second time
+TRACE_MEMORY = True
+
+# Run a function, returning its result, the wall time and the peak traced memory in MB. tracemalloc
+# slows down code that makes lots of small Python objects a lot, so the timed run is done without it
+# and the memory is measured on a second run
+def measure(func: Callable, *args, **kwargs) -> Tuple[object, float, float]:
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    if not TRACE_MEMORY:
+        return result, seconds, float('nan')
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+# Every stage at one scale, returns one record per stage
+def benchmark_scale(data_dir: str, factor: int, encoding: str, max_iter: int, queries: int,
+                    compact: bool = False) -> List[Dict]:
+    records = []
+
+    def record(stage: str, rows_in: int, rows_out: int, seconds: float, peak_mb: float, **extra):
+        records.append({'stage': stage, 'scale': factor, 'rows_in': rows_in, 'rows_out': rows_out,
+                        'seconds': round(seconds, 4), 'peak_mb': None if np.isnan(peak_mb) else round(peak_mb, 2),
+                        **extra})
+        print(f'  {stage:<18} x{factor:<4} {rows_in:>9} rows  {seconds:>9.3f}s  {peak_mb:>9.1f} MB')
+
+    mortality = scale_frame(load_regional_files(data_dir), factor)
+    nutrition = scale_frame(read_nutrition_file(os.path.join(data_dir, NUTRITION_FILE)), factor)
+
+    merged, seconds, peak = measure(merge_mortality_and_nutrition, mortality, nutrition)
+    record('merge', len(mortality) + len(nutrition), len(merged), seconds, peak)
+
+    cleaned, seconds, peak = measure(align_data, merged)
+    record('align_data', len(merged), len(cleaned), seconds, peak)
+
+    # load_and_prepare_data reads a csv, so the cleaned frame goes through a temporary file (not timed)
+    with tempfile.TemporaryDirectory() as tmp:
+        cleaned_path = os.path.join(tmp, 'cleaned_data.csv')
+        cleaned.to_csv(cleaned_path, index=False)
+        X, y = load_and_prepare_data(cleaned_path, FEATURES, TARGET, encoding='sparse', compact=compact)
+
+    # Fitting the preprocessor is the imputation plus the scaler, over every row here
+    preprocessor = Preprocessor(FEATURES, encoding=encoding, compact=compact)
+    X_imputed, seconds, peak = measure(preprocessor.fit_impute, X, y)
+    record('impute', len(X), len(X_imputed), seconds, peak, encoding=encoding, compact=compact)
+
+    y_imputed = preprocessor.impute_target(y)
+    X_scaled = preprocessor.encode(X_imputed)
+    model, seconds, peak = measure(train_neural_network, X_scaled, y_imputed, max_iter=max_iter)
+    record('train', X_scaled.shape[0], X_scaled.shape[0], seconds, peak, encoding=encoding, max_iter=max_iter,
+           compact=compact)
+
+    # Single queries the old way, then every country-year with one batch call
+    imputed_data = pd.concat([X_imputed, y_imputed], axis=1)
+    lookup = build_feature_lookup(imputed_data)
+    all_countries, all_years = lookup.index.get_level_values(0), lookup.index.get_level_values(1)
+    picks = np.random.default_rng(50).choice(len(lookup), size=min(queries, len(lookup)), replace=False)
+    countries, years = all_countries[picks], all_years[picks]
+
+    def single_queries():
+        return [predict_country_mortality_rate(country, year, 60, 50, model, preprocessor, lookup)
+                for country, year in zip(countries, years)]
+
+    _, seconds, peak = measure(single_queries)
+    record('predict_single', len(picks), len(picks), seconds, peak, per_query_ms=round(1000 * seconds / len(picks), 3))
+
+    _, seconds, peak = measure(predict_mortality_rates, all_countries, all_years, model, preprocessor, lookup, 60, 50)
+    record('predict_batch', len(lookup), len(lookup), seconds, peak)
+    return records
+
+# Last recorded run of every (stage, scale) before this one
+def previous_runs(history_path: str) -> Dict[Tuple[str, int], Dict]:
+    previous = {}
+    if os.path.exists(history_path):
+        with open(history_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                previous[(entry['stage'], entry['scale'])] = entry
+    return previous
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every pipeline stage at scaled data sizes')
+    parser.add_argument('--data-dir', default='.', help='folder with the WHO csv files')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='multiples of the real row count')
+    parser.add_argument('--encoding', choices=['onehot', 'sparse'], default='sparse',
+                        help='country encoding, the dense one-hot matrix does not fit in memory at x100')
+    parser.add_argument('--compact', action='store_true', help='float32/int16/categorical dtypes (see compact_dtypes.py)')
+    parser.add_argument('--max-iter', type=int, default=20, help='MLP iterations for the training stage')
+    parser.add_argument('--queries', type=int, default=100, help='single predictions to time')
+    parser.add_argument('--history', default=HISTORY_FILE, help='jsonl file the results are appended to')
+    parser.add_argument('--skip-memory', action='store_true', help="don't measure peak memory (halves the run time)")
+    args = parser.parse_args()
+
+    global TRACE_MEMORY
+    TRACE_MEMORY = not args.skip_memory
+
+    previous = previous_runs(args.history)
+    run = {'commit': current_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__}
+    records = []
+    for factor in args.scales:
+        print(f'Scale x{factor}')
+        records.extend(benchmark_scale(args.data_dir, factor, args.encoding, args.max_iter, args.queries,
+                                       args.compact))
+
+    with open(args.history, 'a') as f:
+        for entry in records:
+            f.write(json.dumps({**run, **entry}) + '\n')
+
+    print(f"\n{'stage':<18} {'scale':>5} {'seconds':>10} {'peak MB':>10}   vs last run")
+    for entry in records:
+        last = previous.get((entry['stage'], entry['scale']))
+        change = (f"{entry['seconds'] / last['seconds']:.2f}x time ({last['commit']})"
+                  if last and last['seconds'] > 0 else '-')
+        peak = '-' if entry['peak_mb'] is None else f"{entry['peak_mb']:.1f}"
+        print(f"{entry['stage']:<18} {entry['scale']:>5} {entry['seconds']:>10.3f} {peak:>10}   {change}")
+    print(f'\nResults appended to {args.history}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Memory-lean dtypes for the modelling data. By default pandas reads every indicator as float64,
+the country as one Python string per row and Year as int64, and the imputation, the scaler and
+the network all stay in float64 from there. In compact mode:
+
+- indicators (and everything else that's a float) are float32
+- the country is a categorical, so a small int code per row instead of a string object
+- Year is int16
+- one-hot country columns are bool in a frame and float32 in the design matrix (sklearn turns
+  anything that isn't float32 into float64 before training)
+
+and the imputation, scaling and training run in float32. memory_report() shows what every stage
+takes against what the same data would take with the default dtypes:
+
+    python NN_with_features.py --compact"""
+
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from country_encoding import COUNTRY_COL
+
+COMPACT_FLOAT = np.float32
+COMPACT_YEAR = np.int16
+
+# The frame with compact dtypes, columns that are already small are left alone
+def compact_frame(df: pd.DataFrame, country_col: str = COUNTRY_COL) -> pd.DataFrame:
+    dtypes = {}
+    for column, dtype in df.dtypes.items():
+        if column == country_col:
+            dtypes[column] = 'category'
+        elif column == 'Year' and not df[column].isna().any():
+            dtypes[column] = COMPACT_YEAR
+        elif pd.api.types.is_float_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+            dtypes[column] = COMPACT_FLOAT
+    return df.astype(dtypes)
+
+# Read a csv straight into compact dtypes, so the float64/string version is never in memory
+def read_compact_csv(file_path: str, usecols: Union[List[str], None] = None, country_col: str = COUNTRY_COL) -> pd.DataFrame:
+    header = pd.read_csv(file_path, nrows=0, usecols=usecols).columns
+    dtypes = {column: 'category' if column == country_col else COMPACT_FLOAT for column in header}
+    return compact_frame(pd.read_csv(file_path, usecols=usecols, dtype=dtypes), country_col)
+
+# Bytes of a frame, series, array or sparse matrix as it is now (strings counted in full)
+def data_bytes(data) -> int:
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(deep=True, index=False).sum())
+    if isinstance(data, pd.Series):
+        return int(data.memory_usage(deep=True, index=False))
+    if sp.issparse(data):
+        data = data.tocsr()
+        return data.data.nbytes + data.indices.nbytes + data.indptr.nbytes
+    return np.asarray(data).nbytes
+
+# Bytes the same data would take with the default dtypes: 8 bytes per number, a string per row for
+# the country and bools as they are. Worked out from the compact data, no default copy is made
+def default_bytes(data) -> int:
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if isinstance(data, pd.DataFrame):
+        total = 0
+        for column in data.columns:
+            values = data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Every row holding its own string, taken as the average size of one country name
+                names = pd.Series(values.cat.categories.astype(str))
+                total += int(len(values) * names.memory_usage(deep=True, index=False) / max(len(names), 1))
+            elif pd.api.types.is_bool_dtype(values.dtype):
+                total += len(values)
+            elif pd.api.types.is_numeric_dtype(values.dtype):
+                total += 8 * len(values)
+            else:
+                total += int(values.memory_usage(deep=True, index=False))
+        return total
+    if sp.issparse(data):
+        data = data.tocsr()
+        return 8 * data.nnz + data.indices.nbytes + data.indptr.nbytes
+    data = np.asarray(data)
+    return data.size if data.dtype == bool else 8 * data.size
+
+# One line of the report: memory of a stage's data now, with the default dtypes and the difference
+def memory_report(stage: str, data) -> Dict:
+    now, default = data_bytes(data), default_bytes(data)
+    return {'stage': stage, 'memory_mb': round(now / 2 ** 20, 3), 'default_mb': round(default / 2 ** 20, 3),
+            'saved_mb': round((default - now) / 2 ** 20, 3), 'saved_pct': round(100 * (1 - now / default), 1) if default else 0.0}
+
+# Print the reports as a table
+def print_memory_report(reports: List[Dict]) -> None:
+    print(f"\n{'stage':<22}{'MB':>10}{'default MB':>12}{'saved MB':>10}{'saved':>8}")
+    for report in reports:
+        print(f"{report['stage']:<22}{report['memory_mb']:>10.2f}{report['default_mb']:>12.2f}"
+              f"{report['saved_mb']:>10.2f}{report['saved_pct']:>7.1f}%")
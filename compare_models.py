@@ -0,0 +1,92 @@
+"""Every model backend (see model_backends.py) trained and tested on the same split and the same
+preprocessed data, with what each one costs next to how accurate it is:
+
+- fit seconds
+- batch throughput: rows per second predicting the whole test set in one call (best of a few runs)
+- single-row latency: median milliseconds of predicting one row at a time, like prediction_server.py
+- MSE and R^2 on the test set
+
+The split and the preprocessor are the ones NN_with_features.py uses, so the numbers line up with it.
+
+    python compare_models.py --models mlp hist_gradient_boosting ridge --params '{"ridge": {"alpha": 0.1}}'"""
+
+import argparse
+import json
+import time
+import warnings
+from typing import Dict, List
+
+import numpy as np
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.model_selection import train_test_split
+
+from model_backends import MODEL_BACKENDS, build_model
+from NN_with_features import FEATURES, TARGET, evaluate_model, load_and_prepare_data
+from preprocessing import Preprocessor
+
+# Fit one backend and measure it on the test rows
+def measure_backend(backend: str, params: Dict, X_train, y_train, X_test, y_test, repeats: int = 3,
+                    latency_rows: int = 200) -> Dict:
+    model = build_model(backend, **params)
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    batch_seconds = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(X_test)
+        batch_seconds = min(batch_seconds, time.perf_counter() - start)
+
+    single = []
+    for row in range(min(latency_rows, X_test.shape[0])):
+        start = time.perf_counter()
+        model.predict(X_test[row:row + 1])
+        single.append(time.perf_counter() - start)
+
+    mse, r2 = evaluate_model(model, X_test, y_test)
+    return {'model': backend, 'params': params, 'fit_seconds': fit_seconds,
+            'rows_per_second': X_test.shape[0] / batch_seconds, 'single_row_ms': 1000 * float(np.median(single)),
+            'mse': float(mse), 'r2': float(r2)}
+
+def print_comparison(results: List[Dict]) -> None:
+    print(f"\n{'model':<24}{'fit s':>9}{'rows/s':>12}{'1 row ms':>10}{'MSE':>11}{'R^2':>8}")
+    for result in results:
+        print(f"{result['model']:<24}{result['fit_seconds']:>9.2f}{result['rows_per_second']:>12,.0f}"
+              f"{result['single_row_ms']:>10.3f}{result['mse']:>11.4f}{result['r2']:>8.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit time, prediction speed and accuracy of every model backend')
+    parser.add_argument('--data', default='cleaned_data.csv')
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_BACKENDS), default=list(MODEL_BACKENDS))
+    parser.add_argument('--params', default='{}',
+                        help='settings per backend as JSON, e.g. \'{"ridge": {"alpha": 0.1}}\'')
+    parser.add_argument('--encoding', choices=['onehot', 'sparse'], default='sparse')
+    parser.add_argument('--compact', action='store_true', help='float32 data (see compact_dtypes.py)')
+    parser.add_argument('--repeats', type=int, default=3, help='batch predictions timed per model, the best is kept')
+    parser.add_argument('--output', default='model_comparison.json')
+    args = parser.parse_args()
+    params = json.loads(args.params)
+
+    X, y = load_and_prepare_data(args.data, FEATURES, TARGET, encoding='sparse', compact=args.compact)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=50)
+    preprocessor = Preprocessor(FEATURES, encoding=args.encoding, compact=args.compact)
+    X_train_scaled = preprocessor.fit_transform(X_train, y_train)
+    X_test_scaled = preprocessor.transform(X_test)
+    y_train, y_test = preprocessor.impute_target(y_train), preprocessor.impute_target(y_test)
+
+    results = []
+    for backend in args.models:
+        print(f'Fitting {backend}...')
+        results.append(measure_backend(backend, params.get(backend, {}), X_train_scaled, y_train, X_test_scaled,
+                                       y_test, args.repeats))
+    print_comparison(results)
+    with open(args.output, 'w') as f:
+        json.dump({'encoding': args.encoding, 'compact': args.compact, 'rows_train': X_train_scaled.shape[0],
+                   'rows_test': X_test_scaled.shape[0], 'results': results}, f, indent=2)
+    print(f'\nResults saved to {args.output}')
+
+if __name__ == "__main__":
+    main()
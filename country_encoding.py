@@ -0,0 +1,30 @@
+"""Country encoding that doesn't blow up the design matrix. pd.get_dummies gives one dense float
+column per country and StandardScaler then scales those 0/1 columns too. Here countries are kept
+as integer codes until the model needs them and only then turned into a scipy sparse one-hot
+block, which sits next to the scaled numeric features. Only the numeric features are scaled."""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.preprocessing import StandardScaler
+
+COUNTRY_COL = 'Countries, territories and areas'
+
+# Integer code for each country in the order of 'categories', -1 for a country that isn't in there
+def country_codes(countries: pd.Series, categories: List[str]) -> np.ndarray:
+    return pd.Categorical(countries, categories=categories).codes.astype(np.int32)
+
+# Sparse one-hot block for the codes, a row for an unknown country (-1) is just left empty
+def country_block(codes: np.ndarray, n_countries: int, dtype=np.float64) -> sp.csr_matrix:
+    known = codes >= 0
+    rows = np.flatnonzero(known)
+    return sp.csr_matrix((np.ones(len(rows), dtype=dtype), (rows, codes[known])), shape=(len(codes), n_countries))
+
+# Scaled numeric features followed by the sparse country block, ready for MLPRegressor
+def sparse_design_matrix(X_numeric: pd.DataFrame, countries: pd.Series, categories: List[str],
+                         scaler: StandardScaler, dtype=np.float64) -> sp.csr_matrix:
+    numeric = sp.csr_matrix(scaler.transform(X_numeric).astype(dtype, copy=False))
+    block = country_block(country_codes(countries, categories), len(categories), dtype)
+    return sp.hstack([numeric, block], format='csr', dtype=dtype)
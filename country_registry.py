@@ -0,0 +1,172 @@
+"""One place for what the project knows about each country: its WHO region, the sub-region used
+to split up the plots and its World Bank income tier. Before this every plotting script typed
+out its own lists (and its own spellings, 'Turkey' in one and 'Turkiye' in another), so the same
+country could land in different groups depending on the script.
+
+Names are put into the WHO spelling first through an alias table, and the lookups work on the
+unique names only and are then spread back over the rows as one array operation, so tagging a
+big frame doesn't mean a Python loop per row:
+
+    df['Region'] = region_of(df['Countries, territories and areas'])"""
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# WHO regions, the same split as the 'Child mortality rates_<Region>.csv' files
+WHO_REGIONS = {
+    'Africa': [
+        'Algeria', 'Angola', 'Benin', 'Botswana', 'Burkina Faso', 'Burundi', 'Cabo Verde', 'Cameroon',
+        'Central African Republic', 'Chad', 'Comoros', 'Congo', "Cote d'Ivoire", 'Democratic Republic of the Congo',
+        'Equatorial Guinea', 'Eritrea', 'Eswatini', 'Ethiopia', 'Gabon', 'Gambia', 'Ghana', 'Guinea', 'Guinea-Bissau',
+        'Kenya', 'Lesotho', 'Liberia', 'Madagascar', 'Malawi', 'Mali', 'Mauritania', 'Mauritius', 'Mozambique',
+        'Namibia', 'Niger', 'Nigeria', 'Rwanda', 'Sao Tome and Principe', 'Senegal', 'Seychelles', 'Sierra Leone',
+        'South Africa', 'South Sudan', 'Togo', 'Uganda', 'United Republic of Tanzania', 'Zambia', 'Zimbabwe'
+    ],
+    'Americas': [
+        'Anguilla', 'Antigua and Barbuda', 'Argentina', 'Bahamas', 'Barbados', 'Belize',
+        'Bolivia (Plurinational State of)', 'Brazil', 'British Virgin Islands', 'Canada', 'Chile', 'Colombia',
+        'Costa Rica', 'Cuba', 'Dominica', 'Dominican Republic', 'Ecuador', 'El Salvador', 'Grenada', 'Guatemala',
+        'Guyana', 'Haiti', 'Honduras', 'Jamaica', 'Mexico', 'Montserrat', 'Nicaragua', 'Panama', 'Paraguay', 'Peru',
+        'Saint Kitts and Nevis', 'Saint Lucia', 'Saint Vincent and the Grenadines', 'Suriname', 'Trinidad and Tobago',
+        'Turks and Caicos Islands', 'United States of America', 'Uruguay', 'Venezuela (Bolivarian Republic of)'
+    ],
+    'Eastern Mediterranean': [
+        'Afghanistan', 'Bahrain', 'Djibouti', 'Egypt', 'Iran (Islamic Republic of)', 'Iraq', 'Jordan', 'Kuwait',
+        'Lebanon', 'Libya', 'Morocco', 'occupied Palestinian territory, including east Jerusalem', 'Oman',
+        'Pakistan', 'Qatar', 'Saudi Arabia', 'Somalia', 'Sudan', 'Syrian Arab Republic', 'Tunisia',
+        'United Arab Emirates', 'Yemen'
+    ],
+    'Europe': [
+        'Albania', 'Andorra', 'Armenia', 'Austria', 'Azerbaijan', 'Belarus', 'Belgium', 'Bosnia and Herzegovina',
+        'Bulgaria', 'Croatia', 'Cyprus', 'Czechia', 'Denmark', 'Estonia', 'Finland', 'France', 'Georgia', 'Germany',
+        'Greece', 'Hungary', 'Iceland', 'Ireland', 'Israel', 'Italy', 'Kazakhstan', 'Kyrgyzstan', 'Latvia',
+        'Lithuania', 'Luxembourg', 'Malta', 'Monaco', 'Montenegro', 'Netherlands (Kingdom of the)', 'North Macedonia',
+        'Norway', 'Poland', 'Portugal', 'Republic of Moldova', 'Romania', 'Russian Federation', 'San Marino',
+        'Serbia', 'Slovakia', 'Slovenia', 'Spain', 'Sweden', 'Switzerland', 'Tajikistan', 'Turkiye', 'Turkmenistan',
+        'Ukraine', 'United Kingdom of Great Britain and Northern Ireland', 'Uzbekistan'
+    ],
+    'South-East Asia': [
+        'Bangladesh', 'Bhutan', "Democratic People's Republic of Korea", 'India', 'Indonesia', 'Maldives',
+        'Myanmar', 'Nepal', 'Sri Lanka', 'Thailand', 'Timor-Leste'
+    ],
+    'Western-Pacific': [
+        'Australia', 'Brunei Darussalam', 'Cambodia', 'China', 'Cook Islands', 'Fiji', 'Japan', 'Kiribati',
+        "Lao People's Democratic Republic", 'Malaysia', 'Marshall Islands', 'Micronesia (Federated States of)',
+        'Mongolia', 'Nauru', 'New Zealand', 'Niue', 'Palau', 'Papua New Guinea', 'Philippines', 'Republic of Korea',
+        'Samoa', 'Singapore', 'Solomon Islands', 'Tonga', 'Tuvalu', 'Vanuatu', 'Viet Nam'
+    ],
+}
+
+# Europe and the Americas split up a bit further for the plots, every other region is its own sub-region
+SUBREGIONS = {
+    'Western Europe': ['Austria', 'Belgium', 'France', 'Germany', 'Ireland', 'Luxembourg', 'Netherlands (Kingdom of the)',
+                       'Switzerland', 'United Kingdom of Great Britain and Northern Ireland'],
+    'Eastern Europe': ['Armenia', 'Azerbaijan', 'Belarus', 'Bulgaria', 'Czechia', 'Georgia', 'Hungary', 'Kazakhstan',
+                       'Kyrgyzstan', 'Poland', 'Republic of Moldova', 'Romania', 'Russian Federation', 'Slovakia',
+                       'Tajikistan', 'Turkmenistan', 'Ukraine', 'Uzbekistan'],
+    'Northern Europe': ['Denmark', 'Estonia', 'Finland', 'Iceland', 'Latvia', 'Lithuania', 'Norway', 'Sweden'],
+    'Southern Europe': ['Albania', 'Andorra', 'Bosnia and Herzegovina', 'Croatia', 'Cyprus', 'Greece', 'Israel', 'Italy',
+                        'Malta', 'Monaco', 'Montenegro', 'North Macedonia', 'Portugal', 'San Marino', 'Serbia',
+                        'Slovenia', 'Spain', 'Turkiye'],
+    'North America': ['Canada', 'United States of America'],
+    'Central America and Caribbean': ['Anguilla', 'Antigua and Barbuda', 'Bahamas', 'Barbados', 'Belize',
+                                      'British Virgin Islands', 'Costa Rica', 'Cuba', 'Dominica', 'Dominican Republic',
+                                      'El Salvador', 'Grenada', 'Guatemala', 'Haiti', 'Honduras', 'Jamaica', 'Mexico',
+                                      'Montserrat', 'Nicaragua', 'Panama', 'Saint Kitts and Nevis', 'Saint Lucia',
+                                      'Saint Vincent and the Grenadines', 'Trinidad and Tobago',
+                                      'Turks and Caicos Islands'],
+    'South America': ['Argentina', 'Bolivia (Plurinational State of)', 'Brazil', 'Chile', 'Colombia', 'Ecuador',
+                      'Guyana', 'Paraguay', 'Peru', 'Suriname', 'Uruguay', 'Venezuela (Bolivarian Republic of)'],
+}
+for _region in ['Africa', 'Eastern Mediterranean', 'South-East Asia', 'Western-Pacific']:
+    SUBREGIONS[_region] = WHO_REGIONS[_region]
+
+# Income tiers based on the World Bank classifications for 2024-2025, only the countries I looked up
+ECONOMIC_TIERS = {
+    'High Income': [
+        'United States of America', 'Russian Federation', 'Croatia', 'Uruguay', 'Panama', 'Malaysia',
+        'Oman', 'Qatar', 'Saudi Arabia', 'United Arab Emirates', 'Trinidad and Tobago', 'Argentina',
+        'Barbados'
+    ],
+    'Upper-Middle Income': [
+        'China', 'Turkiye', 'Belarus', 'Bosnia and Herzegovina', 'Montenegro', 'North Macedonia', 'Serbia',
+        'Kazakhstan', 'Brazil', 'Colombia', 'Costa Rica', 'Cuba', 'Dominican Republic', 'Ecuador', 'Mexico',
+        'Peru', 'Thailand', 'Fiji', 'Iran (Islamic Republic of)', 'Iraq', 'Jordan', 'Lebanon',
+        'Albania', 'Armenia', 'Azerbaijan', 'Georgia'
+    ],
+    'Lower-Middle Income': [
+        'Ukraine', 'Republic of Moldova', 'Belize', 'Bolivia (Plurinational State of)', 'El Salvador',
+        'Guatemala', 'Honduras', 'Nicaragua', 'Paraguay', 'Jamaica', 'Egypt', 'Morocco', 'Tunisia',
+        'Philippines', 'Viet Nam', 'Indonesia', 'India', 'Bhutan', 'Sri Lanka', 'Djibouti', 'Pakistan',
+        'Kyrgyzstan', 'Mongolia', 'Cambodia', "Lao People's Democratic Republic"
+    ],
+    'Low Income': [
+        'Afghanistan', 'Bangladesh', 'Myanmar', 'Nepal', 'Syrian Arab Republic', 'Yemen', 'Somalia', 'Sudan'
+    ],
+}
+
+# Other spellings of the WHO names, matched ignoring case and surrounding spaces
+ALIASES = {
+    'Turkey': 'Turkiye', 'Türkiye': 'Turkiye', 'Vietnam': 'Viet Nam', 'Laos': "Lao People's Democratic Republic",
+    'Bolivia': 'Bolivia (Plurinational State of)', 'Venezuela': 'Venezuela (Bolivarian Republic of)',
+    'Iran': 'Iran (Islamic Republic of)', 'Syria': 'Syrian Arab Republic', 'Russia': 'Russian Federation',
+    'Moldova': 'Republic of Moldova', 'Tanzania': 'United Republic of Tanzania', 'South Korea': 'Republic of Korea',
+    'North Korea': "Democratic People's Republic of Korea", 'Micronesia': 'Micronesia (Federated States of)',
+    "Côte d'Ivoire": "Cote d'Ivoire", 'Ivory Coast': "Cote d'Ivoire", 'Cape Verde': 'Cabo Verde',
+    'Swaziland': 'Eswatini', 'Czech Republic': 'Czechia', 'Macedonia': 'North Macedonia',
+    'Netherlands': 'Netherlands (Kingdom of the)', 'United States': 'United States of America',
+    'USA': 'United States of America', 'United Kingdom': 'United Kingdom of Great Britain and Northern Ireland',
+    'United Kingdom of Great Britain': 'United Kingdom of Great Britain and Northern Ireland',
+    'UK': 'United Kingdom of Great Britain and Northern Ireland',
+    'Palestine': 'occupied Palestinian territory, including east Jerusalem',
+    'Congo (Brazzaville)': 'Congo', 'Congo (Kinshasa)': 'Democratic Republic of the Congo',
+    'East Timor': 'Timor-Leste', 'Brunei': 'Brunei Darussalam',
+}
+
+# Turn {group: [countries]} into {country: group}
+def invert(groups: Dict[str, List[str]]) -> Dict[str, str]:
+    return {country: group for group, countries in groups.items() for country in countries}
+
+# Every country with its region, sub-region and tier, indexed by the WHO name
+COUNTRIES = pd.DataFrame({'region': pd.Series(invert(WHO_REGIONS))})
+COUNTRIES['subregion'] = COUNTRIES.index.map(invert(SUBREGIONS))
+COUNTRIES['economic_tier'] = COUNTRIES.index.map(invert(ECONOMIC_TIERS))
+GROUPS = {'region': list(WHO_REGIONS), 'subregion': list(SUBREGIONS), 'economic_tier': list(ECONOMIC_TIERS)}
+
+_canonical = {name.casefold(): name for name in COUNTRIES.index}
+_canonical.update({alias.casefold(): name for alias, name in ALIASES.items()})
+
+# The WHO spelling of a country name, names that aren't known are just stripped of spaces
+def canonical_name(name: str) -> str:
+    name = name.strip()
+    return _canonical.get(name.casefold(), name)
+
+# Every spelling canonical_name knows (casefolded) with its WHO name, for code that can't import this module
+def spellings() -> Dict[str, str]:
+    return dict(_canonical)
+
+# canonical_name over a whole column, worked out once per distinct name
+def canonical_names(countries: pd.Series) -> pd.Series:
+    codes, uniques = pd.factorize(countries)
+    names = np.array([canonical_name(str(name)) for name in uniques] + [np.nan], dtype=object)
+    return pd.Series(names[codes], index=countries.index, name=countries.name).astype(countries.dtype)
+
+# One attribute for a whole column as a categorical, NaN for countries that don't have one
+def lookup(countries: pd.Series, attribute: str) -> pd.Series:
+    codes, uniques = pd.factorize(countries)
+    dtype = pd.CategoricalDtype(GROUPS[attribute])
+    names = [canonical_name(str(name)) for name in uniques]
+    group_codes = np.append(COUNTRIES[attribute].reindex(names).astype(dtype).cat.codes.to_numpy(), -1)
+    return pd.Series(pd.Categorical.from_codes(group_codes[codes], dtype=dtype), index=countries.index,
+                     name=attribute)
+
+def region_of(countries: pd.Series) -> pd.Series:
+    return lookup(countries, 'region')
+
+def subregion_of(countries: pd.Series) -> pd.Series:
+    return lookup(countries, 'subregion')
+
+def economic_tier_of(countries: pd.Series) -> pd.Series:
+    return lookup(countries, 'economic_tier')
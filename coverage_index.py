@@ -0,0 +1,179 @@
+"""Which (country, year, indicator) cells the WHO files actually have a value for, as one bitmap.
+Built straight from the raw exports (the regional mortality files and the nutrition file), so it
+always matches the data rather than a hand-typed country list:
+
+- countries get the WHO spelling (country_registry.py) and an integer code, years become integers,
+  and a range like "2015-2016" covers every year in it
+- cell [country, year, indicator] is True when that file has a value there, the bits are packed 8 to
+  a byte on disk
+- the non-null count of every indicator column is kept as well (a range is one data point there)
+
+Coverage, dataset discrepancies and counts are then array operations on the bitmap. The index is
+cached next to the stage artifacts (artifact_cache.py) under a key made from the bytes of the
+input files and of the code that builds it, so a new WHO drop is indexed once and every check
+after that only loads the bitmap.
+
+    python coverage_index.py --data-dir <folder with the WHO csv files>"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from artifact_cache import CACHE_DIR, stage_key
+from country_registry import canonical_names
+from hill_climbing import parse_year_column
+from load_who_exports import KEY_COLUMNS, NUTRITION_FILE, REGIONAL_FILE_PATTERN, load_regional_files, read_nutrition_file
+
+INDEX_STAGE = 'coverage_index'
+COUNTRY_COL = KEY_COLUMNS[0]  # Not from country_encoding.py, that one imports sklearn and the checks should start fast
+
+# Integer code of each country in the index's order, -1 for a country it doesn't have
+def country_codes(countries, categories: List[str]) -> np.ndarray:
+    return pd.Categorical(countries, categories=categories).codes.astype(np.int64)
+
+# The raw files the index is built from, in the order they are hashed for the cache key
+def input_files(data_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(data_dir, REGIONAL_FILE_PATTERN))) + [os.path.join(data_dir, NUTRITION_FILE)]
+
+# Every dataset by name, the same frames the merge scripts start from
+def load_datasets(data_dir: str) -> Dict[str, pd.DataFrame]:
+    return {'mortality': load_regional_files(data_dir),
+            'nutrition': read_nutrition_file(os.path.join(data_dir, NUTRITION_FILE))}
+
+# Build the index from frames with a country column, a Year column and any number of indicator columns
+def build_coverage_index(datasets: Dict[str, pd.DataFrame]) -> Dict:
+    countries = {name: canonical_names(frame[COUNTRY_COL]) for name, frame in datasets.items()}
+    spans = {name: parse_year_column(frame['Year']) for name, frame in datasets.items()}
+    categories = sorted(set().union(*(country.dropna().unique() for country in countries.values())))
+    first_year = int(min(span['start'].min() for span in spans.values()))
+    last_year = int(max(span['end'].max() for span in spans.values()))
+
+    indicators, indicator_datasets = [], []
+    for name, frame in datasets.items():
+        columns = [col for col in frame.columns if col not in (COUNTRY_COL, 'Year')]
+        indicators += columns
+        indicator_datasets += [name] * len(columns)
+
+    cells = np.zeros((len(categories), last_year - first_year + 1, len(indicators)), dtype=bool)
+    non_null = np.zeros(len(indicators), dtype=np.int64)
+    column = 0
+    for name, frame in datasets.items():
+        values = frame.drop(columns=[COUNTRY_COL, 'Year']).notna().to_numpy()
+        non_null[column:column + values.shape[1]] = values.sum(axis=0)
+
+        # One entry per year a row covers, then every indicator of the dataset is set in one go
+        codes = country_codes(countries[name], categories)
+        start = spans[name]['start'].fillna(-1).to_numpy(np.int64)
+        length = np.where((codes >= 0) & (start >= 0), spans[name]['end'].fillna(-1).to_numpy(np.int64) - start + 1, 0)
+        rows = np.repeat(np.arange(len(frame)), length)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(length) - length, length)
+        cells[codes[rows], start[rows] + offsets - first_year, column:column + values.shape[1]] |= values[rows]
+        column += values.shape[1]
+
+    return {'cells': cells, 'countries': categories, 'years': np.arange(first_year, last_year + 1),
+            'indicators': indicators, 'indicator_datasets': indicator_datasets, 'non_null': non_null}
+
+# Write the index with the bitmap packed, through a temporary file like cached_stage
+def save_coverage_index(index: Dict, path: str) -> None:
+    meta = {'shape': list(index['cells'].shape), 'countries': index['countries'], 'first_year': int(index['years'][0]),
+            'indicators': index['indicators'], 'indicator_datasets': index['indicator_datasets']}
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, bits=np.packbits(index['cells'], axis=None), non_null=index['non_null'], meta=np.array(json.dumps(meta)))
+    os.replace(tmp_path, path)
+
+def load_coverage_index(path: str) -> Dict:
+    with np.load(path) as data:
+        bits, non_null, meta = data['bits'], data['non_null'], json.loads(str(data['meta']))
+    shape = tuple(meta['shape'])
+    cells = np.unpackbits(bits, count=int(np.prod(shape))).astype(bool).reshape(shape)
+    return {'cells': cells, 'countries': meta['countries'], 'years': np.arange(meta['first_year'], meta['first_year'] + shape[1]),
+            'indicators': meta['indicators'], 'indicator_datasets': meta['indicator_datasets'], 'non_null': non_null}
+
+# The index of the files in data_dir, only rebuilt when one of them has changed
+def cached_coverage_index(data_dir: str = '.', cache_dir: str = CACHE_DIR) -> Dict:
+    code = [build_coverage_index, canonical_names, parse_year_column, load_regional_files]
+    path = os.path.join(cache_dir, f'{INDEX_STAGE}-{stage_key(INDEX_STAGE, input_files(data_dir), code=code)}.npz')
+    if os.path.exists(path):
+        return load_coverage_index(path)
+    index = build_coverage_index(load_datasets(data_dir))
+    os.makedirs(cache_dir, exist_ok=True)
+    save_coverage_index(index, path)
+    return index
+
+# Positions of the named countries/indicators (all of them for None), unknown names are an error
+def _positions(names: List[str], wanted: Union[List[str], None], kind: str) -> np.ndarray:
+    if wanted is None:
+        return np.arange(len(names))
+    position = {name: i for i, name in enumerate(names)}
+    missing = [name for name in wanted if name not in position]
+    if missing:
+        raise ValueError(f'Unknown {kind}: {missing}')
+    return np.array([position[name] for name in wanted], dtype=np.int64)
+
+# Indicator columns of one dataset (or of every dataset for None)
+def dataset_indicators(index: Dict, dataset: Union[str, None] = None) -> List[str]:
+    return [indicator for indicator, name in zip(index['indicators'], index['indicator_datasets'])
+            if dataset is None or name == dataset]
+
+# Whether each (country, year, indicator) has a value, for equal length lists or anything that broadcasts.
+# Countries and years outside the index just aren't covered
+def covered(index: Dict, countries, years, indicators) -> np.ndarray:
+    codes = country_codes(np.atleast_1d(np.asarray(countries, dtype=object)), index['countries'])
+    year_positions = np.atleast_1d(np.asarray(years, dtype=np.int64)) - index['years'][0]
+    indicator_positions = _positions(index['indicators'], list(np.atleast_1d(indicators)), 'indicators')
+    codes, year_positions, indicator_positions = np.broadcast_arrays(codes, year_positions, indicator_positions)
+    inside = (codes >= 0) & (year_positions >= 0) & (year_positions < len(index['years']))
+    result = np.zeros(codes.shape, dtype=bool)
+    result[inside] = index['cells'][codes[inside], year_positions[inside], indicator_positions[inside]]
+    return result
+
+# Country x year table of whether any (or all) of the indicators has a value
+def coverage_table(index: Dict, indicators: Union[List[str], None] = None, require_all: bool = False) -> pd.DataFrame:
+    cells = index['cells'][:, :, _positions(index['indicators'], indicators, 'indicators')]
+    table = cells.all(axis=2) if require_all else cells.any(axis=2)
+    return pd.DataFrame(table, index=pd.Index(index['countries'], name=COUNTRY_COL), columns=index['years'])
+
+# Countries with at least one value in a dataset
+def dataset_countries(index: Dict, dataset: str) -> List[str]:
+    has_value = coverage_table(index, dataset_indicators(index, dataset)).to_numpy().any(axis=1)
+    return [country for country, present in zip(index['countries'], has_value) if present]
+
+# Countries only the first dataset has values for, and countries only the second one has
+def dataset_discrepancies(index: Dict, first: str, second: str) -> Tuple[List[str], List[str]]:
+    in_first = coverage_table(index, dataset_indicators(index, first)).to_numpy().any(axis=1)
+    in_second = coverage_table(index, dataset_indicators(index, second)).to_numpy().any(axis=1)
+    countries = np.array(index['countries'], dtype=object)
+    return countries[in_first & ~in_second].tolist(), countries[in_second & ~in_first].tolist()
+
+# Non-null values of every indicator column in the files, and how many country-years that covers
+def indicator_counts(index: Dict) -> pd.DataFrame:
+    return pd.DataFrame({'dataset': index['indicator_datasets'], 'non_null': index['non_null'],
+                         'country_years': index['cells'].sum(axis=(0, 1))}, index=pd.Index(index['indicators'], name='indicator'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Build (or load) the coverage bitmap of the WHO files and summarise it')
+    parser.add_argument('--data-dir', default=os.environ.get('AAI_DATA_DIR', '.'),
+                        help="folder holding the 'Child mortality rates_*.csv' files and the nutrition file")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = cached_coverage_index(args.data_dir, args.cache_dir)
+    seconds = time.perf_counter() - start
+    cells = index['cells']
+    print(f"{len(index['countries'])} countries x {len(index['years'])} years ({index['years'][0]}-{index['years'][-1]}) "
+          f"x {len(index['indicators'])} indicators, {cells.sum()} of {cells.size} cells have a value ({seconds:.3f}s)")
+    with pd.option_context('display.max_colwidth', 80, 'display.width', 200):
+        print(indicator_counts(index))
+    only_mortality, only_nutrition = dataset_discrepancies(index, 'mortality', 'nutrition')
+    print(f'{len(only_mortality)} countries only in the mortality data, {len(only_nutrition)} only in the nutrition data')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Cross-validation for the neural network instead of judging it on one random train/test split.
+The random split in NN_with_features.py mixes years, so the model is partly tested on years that
+sit between years it was trained on. Two schemes are run here:
+
+- k-fold: the usual shuffled folds over every country-year
+- rolling-origin: train on every year <= T, test on the years just after T, for several cut-off
+  years T, which is how the model would actually be used (predicting years it hasn't seen)
+
+Every fold runs in its own worker process. The raw data (features with their gaps, countries as
+codes, the target and the years) is written once as .npy files and every worker memory-maps them,
+so a worker is only sent the description of its fold (e.g. ('rolling', 2005, 5)) and never a copy
+of the data; adding workers doesn't multiply the memory used by the data. Each fold fits its own
+Preprocessor (see preprocessing.py) on its training rows only, so the KNN imputation, the target
+fill and the scaler never see the fold's test years, and the test rows just go through transform()
+like new rows do in NN_with_features.py.
+
+    python cross_validation.py --folds 5 --cutoffs 2000 2005 2010 2015 --workers 4"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.model_selection import KFold
+from threadpoolctl import threadpool_limits
+
+from country_encoding import COUNTRY_COL
+from NN_with_features import FEATURES, TARGET, evaluate_model, load_and_prepare_data, train_neural_network
+from preprocessing import Preprocessor
+
+# Write the raw data as plain arrays the workers can memory-map: the numeric features with their
+# NaNs, the countries as codes into a name list, the target (NaN where it's missing) and the years.
+# Nothing is imputed here, that happens per fold
+def write_shared_arrays(X: pd.DataFrame, y: pd.Series, encoding: str, n_neighbors: int, folder: str) -> Dict:
+    countries = X[COUNTRY_COL].astype(str).astype('category')
+    layout = {'encoding': encoding, 'n_neighbors': n_neighbors, 'rows': len(X),
+              'categories': list(countries.cat.categories)}
+    np.save(os.path.join(folder, 'codes.npy'), countries.cat.codes.to_numpy(np.int32))
+    np.save(os.path.join(folder, 'X.npy'), X[FEATURES].to_numpy(np.float64))
+    np.save(os.path.join(folder, 'y.npy'), y.to_numpy(np.float64))
+    np.save(os.path.join(folder, 'years.npy'), X['Year'].to_numpy(np.int32))
+    with open(os.path.join(folder, 'layout.json'), 'w') as f:
+        json.dump(layout, f)
+    return layout
+
+# The memory-mapped arrays, opened once per worker process
+_shared: Dict[str, Dict] = {}
+
+def shared_arrays(folder: str) -> Dict:
+    if folder not in _shared:
+        with open(os.path.join(folder, 'layout.json')) as f:
+            arrays = json.load(f)
+        for name in ['X', 'y', 'years', 'codes']:
+            arrays[name] = np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r')
+        _shared[folder] = arrays
+    return _shared[folder]
+
+# Train and test rows of a fold from its description, worked out inside the worker from the shared years
+def fold_rows(fold: Tuple, arrays: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    if fold[0] == 'kfold':
+        _, n_folds, i, seed = fold
+        return list(KFold(n_splits=n_folds, shuffle=True, random_state=seed).split(np.arange(arrays['rows'])))[i]
+    _, cutoff, horizon = fold
+    years = np.asarray(arrays['years'])
+    test = (years > cutoff) if horizon is None else (years > cutoff) & (years <= cutoff + horizon)
+    return np.flatnonzero(years <= cutoff), np.flatnonzero(test)
+
+# Some rows of the shared arrays back as a frame the Preprocessor takes, and their target
+def fold_frame(arrays: Dict, rows: np.ndarray) -> Tuple[pd.DataFrame, pd.Series]:
+    X = pd.DataFrame(arrays['X'][rows], columns=FEATURES)
+    X[COUNTRY_COL] = np.asarray(arrays['categories'], dtype=object)[arrays['codes'][rows]]
+    return X, pd.Series(arrays['y'][rows], name=TARGET)
+
+# Train and score one fold, runs in a worker process
+def evaluate_fold(fold: Tuple, folder: str, hidden_layers: Tuple[int, ...], max_iter: int) -> Dict:
+    arrays = shared_arrays(folder)
+    train, test = fold_rows(fold, arrays)
+    if len(train) == 0 or len(test) == 0:
+        return {'fold': list(fold), 'n_train': len(train), 'n_test': len(test), 'mse': None, 'r2': None}
+
+    start = time.perf_counter()
+    X_train, y_train = fold_frame(arrays, train)
+    X_test, y_test = fold_frame(arrays, test)
+    preprocessor = Preprocessor(FEATURES, encoding=arrays['encoding'], n_neighbors=arrays['n_neighbors'])
+    X_train_scaled = preprocessor.fit_transform(X_train, y_train)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        model = train_neural_network(X_train_scaled, preprocessor.impute_target(y_train),
+                                     hidden_layers=hidden_layers, max_iter=max_iter)
+    mse, r2 = evaluate_model(model, preprocessor.transform(X_test), preprocessor.impute_target(y_test))
+    return {'fold': list(fold), 'n_train': len(train), 'n_test': len(test), 'mse': mse, 'r2': r2,
+            'fit_seconds': time.perf_counter() - start}
+
+# One BLAS thread per worker, otherwise every worker tries to use every core
+def limit_threads():
+    threadpool_limits(1)
+
+# Every fold of every scheme across a process pool, in the order they were given
+def cross_validate(folds: List[Tuple], folder: str, hidden_layers: Tuple[int, ...], max_iter: int,
+                   workers: int) -> List[Dict]:
+    if workers <= 1:
+        return [evaluate_fold(fold, folder, hidden_layers, max_iter) for fold in folds]
+    with ProcessPoolExecutor(max_workers=workers, initializer=limit_threads) as pool:
+        return list(pool.map(evaluate_fold, folds, [folder] * len(folds), [hidden_layers] * len(folds),
+                             [max_iter] * len(folds)))
+
+# Mean and spread of the fold scores of one scheme
+def summarise(results: List[Dict], scheme: str) -> Dict:
+    scored = [result for result in results if result['fold'][0] == scheme and result['mse'] is not None]
+    mse = np.array([result['mse'] for result in scored])
+    r2 = np.array([result['r2'] for result in scored])
+    return {'scheme': scheme, 'folds': len(scored), 'mse_mean': float(mse.mean()), 'mse_std': float(mse.std()),
+            'r2_mean': float(r2.mean()), 'r2_std': float(r2.std())}
+
+def main():
+    parser = argparse.ArgumentParser(description='k-fold and rolling-origin cross-validation of the neural network')
+    parser.add_argument('--data', default='cleaned_data.csv')
+    parser.add_argument('--encoding', choices=['onehot', 'sparse'], default='onehot')
+    parser.add_argument('--n-neighbors', type=int, default=10)
+    parser.add_argument('--folds', type=int, default=5, help='k for k-fold, 0 to skip it')
+    parser.add_argument('--cutoffs', type=int, nargs='*', default=[2000, 2005, 2010, 2015],
+                        help='last training year of each rolling-origin fold')
+    parser.add_argument('--horizon', type=int, default=5, help='years after the cut-off that are tested, 0 for all')
+    parser.add_argument('--hidden-layers', type=int, nargs='+', default=[100, 50])
+    parser.add_argument('--max-iter', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--shared-dir', help='where the memory-mapped arrays go (default: a temporary folder)')
+    parser.add_argument('--output', default='cross_validation.json')
+    args = parser.parse_args()
+
+    X, y = load_and_prepare_data(args.data, FEATURES, TARGET, encoding='sparse')
+    folds = [('kfold', args.folds, i, 50) for i in range(args.folds)]
+    folds += [('rolling', cutoff, args.horizon or None) for cutoff in args.cutoffs]
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=args.shared_dir) as folder:
+        write_shared_arrays(X, y, args.encoding, args.n_neighbors, folder)
+        results = cross_validate(folds, folder, tuple(args.hidden_layers), args.max_iter, args.workers)
+
+    for result in results:
+        scores = '(no rows)' if result['mse'] is None else f"MSE {result['mse']:9.4f}  R^2 {result['r2']:.4f}"
+        print(f"{str(tuple(result['fold'])):<28} train {result['n_train']:>6}  test {result['n_test']:>6}  {scores}")
+    summaries = [summarise(results, scheme) for scheme in ['kfold', 'rolling']
+                 if any(result['fold'][0] == scheme and result['mse'] is not None for result in results)]
+    for summary in summaries:
+        print(f"{summary['scheme']:<8} MSE {summary['mse_mean']:.4f} +/- {summary['mse_std']:.4f}   "
+              f"R^2 {summary['r2_mean']:.4f} +/- {summary['r2_std']:.4f}  ({summary['folds']} folds)")
+    with open(args.output, 'w') as f:
+        json.dump({'summaries': summaries, 'folds': results}, f, indent=2)
+    print(f'Cross-validation took {time.perf_counter() - start:.1f}s, results saved to {args.output}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Generate synthetic data in exactly the WHO export format, for load testing the pipeline on
+far more country-years than the real files have. It writes one 'Child mortality rates_<Region>.csv'
+per region (with the two-row header, quoted cells, years with a leading space, "mean [lo-hi]"
+cells and death counts with spaces as thousands separators) and an
+'Infant nutrition data by country.csv' with survey years, some of them ranges like " 2015-2016".
+
+The numbers follow the rough shape of the real data: every country starts from its own mortality
+level and declines at its own rate, boys slightly above girls, deaths follow from the rate and a
+per-country birth count, and only some countries have a handful of breastfeeding surveys.
+
+    python generate_synthetic_data.py --countries 20000 --output-dir synthetic_data"""
+
+import argparse
+import csv
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from load_who_exports import NUTRITION_FILE
+
+REGIONS = ['Africa', 'Americas', 'Eastern_Mediterranean', 'Europe', 'South_East_Asia', 'Western_Pacific']
+MORTALITY_GROUPS = ['Under-five mortality rate (per 1000 live births) (SDG 3.2.1)',
+                    'Number of deaths among children under-five']
+SEXES = [' Both sexes', ' Male', ' Female']
+NUTRITION_COLUMNS = ['Countries, territories and areas', 'Year', 'Early initiation of breastfeeding (%)',
+                     'Infants exclusively breastfed for the first six months of life (%)']
+
+# Numbers the way WHO writes them: at most two decimals and no trailing zeros ("248", "22.3", "3.71")
+def format_rate(values: np.ndarray) -> pd.Series:
+    text = pd.Series(np.round(values, 2)).map('{:.2f}'.format)
+    return text.str.replace(r'\.?0+$', '', regex=True)
+
+# Whole numbers with a space as the thousands separator, e.g. "21 567"
+def format_count(values: np.ndarray) -> pd.Series:
+    return pd.Series(np.round(values).astype(np.int64)).map('{:,}'.format).str.replace(',', ' ', regex=False)
+
+# "mean [lo-hi]" cells
+def interval_cells(mean: pd.Series, lo: pd.Series, hi: pd.Series) -> pd.Series:
+    return mean + ' [' + lo + '-' + hi + ']'
+
+# Write a csv quoted like the WHO exports, header rows first
+def write_who_csv(path: str, header_rows: List[List[str]], rows: pd.DataFrame) -> None:
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerows(header_rows)
+    rows.to_csv(path, mode='a', header=False, index=False, quoting=csv.QUOTE_ALL)
+
+# Mortality rows for a set of countries, years run newest first within each country like the real files
+def mortality_rows(countries: np.ndarray, first_year: int, last_year: int, rng: np.random.Generator) -> pd.DataFrame:
+    years = np.arange(last_year, first_year - 1, -1)
+    n_countries, n_years = len(countries), len(years)
+    country = np.repeat(countries, n_years)
+    year = np.tile(years, n_countries)
+
+    # Each country has its own starting level, yearly decline and number of births
+    level = np.repeat(rng.lognormal(np.log(150), 0.6, n_countries), n_years)
+    decline = np.repeat(rng.uniform(0.01, 0.05, n_countries), n_years)
+    births = np.repeat(rng.lognormal(np.log(200_000), 1.2, n_countries), n_years)
+    both = level * np.exp(-decline * (year - first_year)) * rng.lognormal(0, 0.02, len(year))
+    rates = {' Both sexes': both, ' Male': both * 1.08, ' Female': both * 0.92}
+
+    # The uncertainty interval gets wider the further back the estimate goes
+    width = 0.05 + 0.25 * (last_year - year) / max(last_year - first_year, 1)
+    data = {'Countries, territories and areas': country, 'Year': pd.Series(year).map(' {}'.format)}
+    for sex in SEXES:
+        rate = rates[sex]
+        data[f'rate{sex}'] = interval_cells(format_rate(rate), format_rate(rate * (1 - width)),
+                                            format_rate(rate * (1 + width)))
+    # Death counts only go back to 1990 in the real exports
+    recent = year >= 1990
+    for sex in SEXES:
+        share = births * (1.0 if sex == ' Both sexes' else 0.5)
+        deaths = rates[sex] * share / 1000
+        cells = interval_cells(format_count(deaths), format_count(deaths * (1 - width)),
+                               format_count(deaths * (1 + width)))
+        data[f'deaths{sex}'] = cells.where(recent, '')
+    return pd.DataFrame(data)
+
+# A few breastfeeding surveys for roughly 'coverage' of the countries, some over two-year ranges
+def nutrition_rows(countries: np.ndarray, first_year: int, last_year: int, coverage: float,
+                   rng: np.random.Generator) -> pd.DataFrame:
+    surveyed = countries[rng.random(len(countries)) < coverage]
+    surveys = rng.integers(1, 7, len(surveyed))
+    country = np.repeat(surveyed, surveys)
+    n = len(country)
+    start = rng.integers(max(first_year, 1986), last_year, n)
+    is_range = rng.random(n) < 0.2
+    year = pd.Series(start).map(' {}'.format)
+    year[is_range] = year[is_range] + '-' + pd.Series(start[is_range] + 1).astype(str).to_numpy()
+
+    early = rng.uniform(15, 90, n)
+    exclusive = rng.uniform(5, 70, n)
+    early_cells = format_rate(np.round(early, 1))
+    exclusive_cells = format_rate(np.round(exclusive, 1))
+    # Some surveys come with an interval, and most surveys only report one of the two indicators
+    with_interval = rng.random(n) < 0.3
+    exclusive_cells[with_interval] = interval_cells(
+        exclusive_cells[with_interval], format_rate(np.round(exclusive * 0.9, 1))[with_interval],
+        format_rate(np.round(exclusive * 1.1, 1))[with_interval])
+    which = rng.random(n)
+    early_cells[which < 0.45] = ''
+    exclusive_cells[(which >= 0.45) & (which < 0.8)] = ''
+    rows = pd.DataFrame({NUTRITION_COLUMNS[0]: country, NUTRITION_COLUMNS[1]: year,
+                         NUTRITION_COLUMNS[2]: early_cells, NUTRITION_COLUMNS[3]: exclusive_cells})
+    return rows.sort_values(NUTRITION_COLUMNS[:2], kind='stable', ignore_index=True)
+
+def generate(output_dir: str, n_countries: int, first_year: int, last_year: int, coverage: float,
+             seed: int) -> int:
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    countries = np.array([f'Synthetic Country {i:06d}' for i in range(n_countries)], dtype=object)
+
+    header_rows = [['', ''] + [group for group in MORTALITY_GROUPS for _ in SEXES],
+                   ['Countries, territories and areas', 'Year'] + SEXES * len(MORTALITY_GROUPS)]
+    total = 0
+    for region, region_countries in zip(REGIONS, np.array_split(countries, len(REGIONS))):
+        rows = mortality_rows(region_countries, first_year, last_year, rng)
+        write_who_csv(os.path.join(output_dir, f'Child mortality rates_{region}.csv'), header_rows, rows)
+        total += len(rows)
+
+    nutrition = nutrition_rows(countries, first_year, last_year, coverage, rng)
+    write_who_csv(os.path.join(output_dir, NUTRITION_FILE), [NUTRITION_COLUMNS], nutrition)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic WHO-format mortality and nutrition files')
+    parser.add_argument('--output-dir', default='synthetic_data')
+    parser.add_argument('--countries', type=int, default=2000, help='number of synthetic countries')
+    parser.add_argument('--first-year', type=int, default=1950)
+    parser.add_argument('--last-year', type=int, default=2021)
+    parser.add_argument('--coverage', type=float, default=0.6, help='share of countries with breastfeeding surveys')
+    parser.add_argument('--seed', type=int, default=50)
+    args = parser.parse_args()
+
+    rows = generate(args.output_dir, args.countries, args.first_year, args.last_year, args.coverage, args.seed)
+    print(f"{rows} synthetic country-years written to '{args.output_dir}'.")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,29 @@
 """File to handle year ranges and error bar data, then apply hill climbing 
-to optimise the interpolation process, room for improvement in the code
-but overrall the functionality is there."""
+to optimise the interpolation process. The year ranges for every country are
+expanded with numpy array operations, pass --workers to split the countries
+across several processes for really big files."""
 
+import argparse
 import pandas as pd
 import numpy as np
 import re
-from typing import Dict, List, Union
+from concurrent.futures import ProcessPoolExecutor
+from artifact_cache import cached_stage
+from stage_telemetry import stage_telemetry
+from typing import Callable, Dict, Tuple, Union
 
-# Parse year into a list of integers for ranges like 2008-2009, these are split
-def parse_year(year_str: Union[str, float]) -> Union[List[int], None]:
-    if pd.isna(year_str) or year_str == 'Year':
-        return None
-    if '-' in str(year_str):  # Check for ranges like "2008-2009"
-        return [int(y) for y in year_str.split('-')]
-    return [int(year_str)]  # Single year, just return it in a list
+# Parse the Year column into start/end years, ranges like 2008-2009 are split and single years
+# get the same start and end. Anything that isn't a year (e.g. the 'Year' header rows) becomes NaN
+def parse_year_column(years: pd.Series) -> pd.DataFrame:
+    parts = years.astype('string').str.strip().str.extract(r'^(\d+)(?:\s*-\s*(\d+))?$')
+    start = pd.to_numeric(parts[0])
+    end = pd.to_numeric(parts[1]).fillna(start)
+    return pd.DataFrame({'start': start, 'end': end}, index=years.index)
+
+# WHO cells look like "22.34 [19.71-25.37]", the death counts also use spaces as
+# thousands separators e.g. "21 567 [19 036-24 499]" so spaces are allowed inside numbers
+WHO_VALUE_PATTERN = (r'^\s*(?P<mean>\d[\d ]*(?:\.\d+)?)\s*'
+                     r'(?:\[\s*(?P<lo>\d[\d ]*(?:\.\d+)?)\s*-\s*(?P<hi>\d[\d ]*(?:\.\d+)?)\s*\])?')
 
 #Extract mean value, if this is a string then I will just extract the number
 def get_mean_val(value: Union[str, float, int]) -> Union[float, str]:
@@ -22,38 +32,110 @@ def get_mean_val(value: Union[str, float, int]) -> Union[float, str]:
     if isinstance(value, (int, float)):
         return value  # If there's already a number then nothing to do so return it.
     if isinstance(value, str):
-        match = re.match(r'^(\d+(?:\.\d+)?)', value)
+        match = re.match(WHO_VALUE_PATTERN, value)
         if match:
-            return float(match.group(1))  # Convert string to float.
+            return float(match.group('mean').replace(' ', ''))  # Convert string to float.
     return value  # Return as-is if nothing matches.
 
-# Interpolate between two years based on exponent that tweaks the curve
+# Vectorised version of get_mean_val for a whole column, this also keeps the interval bounds.
+# Returns a frame with float 'mean', 'lo' and 'hi' columns (lo/hi are NaN if there's no interval)
+def parse_value_column(values: pd.Series) -> pd.DataFrame:
+    if pd.api.types.is_numeric_dtype(values):
+        # Already numbers (e.g. the breastfeeding columns) so there are no bounds to extract
+        parsed = pd.DataFrame({'mean': values.astype(float)}, index=values.index)
+        parsed['lo'] = np.nan
+        parsed['hi'] = np.nan
+        return parsed
+    parts = values.astype('string').str.extract(WHO_VALUE_PATTERN)
+    # Drop the thousands separators then convert every part to float in one go
+    parts = parts.apply(lambda part: part.str.replace(' ', '', regex=False))
+    return parts.astype(float)
+
+# Parse every indicator column of the merged file at once, keyed by column name
+def parse_indicator_columns(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    indicator_cols = [col for col in df.columns if col not in ('Countries, territories and areas', 'Year')]
+    return {col: parse_value_column(df[col]) for col in indicator_cols}
+
+# Interpolate between two years based on exponent that tweaks the curve.
+# Also works on numpy arrays of years/values as long as every range spans more than one year
 def interpolate_value(start_year: int, end_year: int, start_value: float, 
                       end_value: float, target_year: int, exponent: float) -> float:
-    if start_year == end_year:
+    if np.isscalar(start_year) and start_year == end_year:
         return start_value  # Return value if no range. e.g: 2008 by itself.
     progress = (target_year - start_year) / (end_year - start_year)
     adjusted_progress = progress ** exponent  # Raise progress to exponent for curve tweaking
     return start_value + adjusted_progress * (end_value - start_value)
 
-# Calculate smoothness of data: less extreme values and differences = better
-def calc_smoothness(df: pd.DataFrame) -> float:
-    numeric_cols = df.select_dtypes(include=[np.number])
-    diff = numeric_cols.diff().abs().mean().mean()  # Average of absolute differences
-    # Check for extreme values (upper/lower 1% of data)
-    extremes = ((numeric_cols > numeric_cols.quantile(0.99)) | 
-                (numeric_cols < numeric_cols.quantile(0.01))).sum().sum()
-    # Balance between "smooth" (less diff) and extremes (less count)
-    return -diff - 0.1 * extremes
-
-# Hill-climbing optimization to fine-tune exponent parameter for smoother iterations.
-def hill_climbing(df: pd.DataFrame, initial_exponent: float = 1.0, iterations: int = 100) -> float:
+# Settings for the exponent search, kept in one place so they can be tweaked (and hashed) together
+SEARCH_SETTINGS = {'strategy': 'hill', 'initial_exponent': 1.0, 'iterations': 100,
+                   'seed': 50, 'bounds': (0.2, 5.0)}
+
+# Fill in the planned years for a given exponent, one array operation for the whole column
+def apply_fill_plan(plan: Dict[str, np.ndarray], exponent: float) -> np.ndarray:
+    if len(plan['year']) == 0:
+        return plan['year']
+    return interpolate_value(plan['start'], plan['end'], plan['start_value'],
+                             plan['end_value'], plan['year'], exponent)
+
+# Score function for one column of one country: less extreme values and differences = better.
+# The quantiles only depend on the observed values so they are worked out once here,
+# each call just scores the interpolated series
+def smoothness_objective(known_years: np.ndarray, known_values: np.ndarray, range_values: np.ndarray,
+                         plan: Dict[str, np.ndarray]) -> Callable[[float], float]:
+    observed = np.concatenate([known_values, range_values])
+    upper, lower = np.quantile(observed, 0.99), np.quantile(observed, 0.01)
+    years = np.concatenate([known_years, plan['year']])
+    order = np.argsort(years, kind='stable')
+
+    def objective(exponent: float) -> float:
+        series = np.concatenate([known_values, apply_fill_plan(plan, exponent)])[order]
+        diff = np.abs(np.diff(series)).mean() if len(series) > 1 else 0.0
+        extremes = np.count_nonzero((series > upper) | (series < lower))
+        return -diff - 0.1 * extremes
+
+    return objective
+
+# Golden-section search for the exponent that maximises the objective within the bounds
+def golden_section_search(objective: Callable[[float], float], low: float, high: float,
+                          iterations: int = 100, tolerance: float = 1e-3) -> float:
+    ratio = (np.sqrt(5) - 1) / 2
+    left, right = high - ratio * (high - low), low + ratio * (high - low)
+    left_score, right_score = objective(left), objective(right)
+    for _ in range(iterations):
+        if high - low < tolerance:
+            break
+        if left_score > right_score:
+            high, right, right_score = right, left, left_score
+            left = high - ratio * (high - low)
+            left_score = objective(left)
+        else:
+            low, left, left_score = left, right, right_score
+            right = low + ratio * (high - low)
+            right_score = objective(right)
+    return (low + high) / 2
+
+# Optimise the exponent for a score function. 'hill' is the original random tweak hill climb,
+# 'random' samples the bounds uniformly and 'golden' does a golden-section search.
+# The hill and random searches are seeded so the cleaned file comes out the same every run
+def hill_climbing(objective: Callable[[float], float], initial_exponent: float = 1.0, iterations: int = 100,
+                  strategy: str = 'hill', seed: Union[int, None] = None,
+                  bounds: Tuple[float, float] = (0.2, 5.0)) -> float:
+    if strategy == 'golden':
+        return golden_section_search(objective, bounds[0], bounds[1], iterations)
+    if strategy not in ('hill', 'random'):
+        raise ValueError(f"Unknown exponent search strategy '{strategy}'")
+
+    rng = np.random.default_rng(seed)
     current_exponent = initial_exponent
-    current_score = calc_smoothness(df)  # Initial score
+    current_score = objective(current_exponent)  # Initial score
 
     for _ in range(iterations):
-        new_exponent = current_exponent * np.random.uniform(0.9, 1.1)  # Randomly tweak exponent
-        new_score = calc_smoothness(df)
+        if strategy == 'hill':
+            new_exponent = current_exponent * rng.uniform(0.9, 1.1)  # Randomly tweak exponent
+        else:
+            new_exponent = rng.uniform(bounds[0], bounds[1])  # Random guess anywhere in the bounds
+        new_exponent = float(np.clip(new_exponent, bounds[0], bounds[1]))
+        new_score = objective(new_exponent)
 
         # If new score is better/higher, update the exponent
         if new_score > current_score:
@@ -62,69 +144,102 @@ def hill_climbing(df: pd.DataFrame, initial_exponent: float = 1.0, iterations: i
 
     return current_exponent  # Return the best exponent we found
 
-# Process country data year by year (handles ranges, single years, etc.)
-def process_country(group: pd.DataFrame) -> Dict[int, Dict[str, float]]:
-    country_data = {}  # Store processed data here
-
-    for _, row in group.iterrows():
-        years = parse_year(row['Year'])  # Parse the year/years
-        if years is None:
-            continue  # Continue if no valid year
-
-        if len(years) == 1:
-            # If single year like 2008 then just add it
-            year = years[0]
-            if year not in country_data:
-                country_data[year] = {}
-            
-            # Store each column's value for the year
-            for col in group.columns:
-                if col != 'Year' and pd.notna(row[col]):
-                    country_data[year][col] = get_mean_val(row[col])  # Get value
-        else:
-            # Range of years, interpolation is needed.
-            start_year, end_year = years
-            optimized_exponent = hill_climbing(group)  # Optimise the exponent
-            
-            for year in range(start_year, end_year + 1):
-                if year not in country_data:
-                    country_data[year] = {}
-                
-                for col in group.columns:
-                    if col != 'Year' and pd.notna(row[col]):
-                        # Find valid values before and after for interpolation
-                        before = next((y for y in range(year, start_year - 1, -1) if y in country_data and col in country_data[y] and pd.notna(country_data[y][col])), None)
-                        after = next((y for y in range(year, end_year + 1) if y in country_data and col in country_data[y] and pd.notna(country_data[y][col])), None)
-                        
-                        if before is not None and after is not None:
-                            # Interpolate between the two
-                            country_data[year][col] = interpolate_value(before, after, country_data[before][col], country_data[after][col], year, optimized_exponent)
-                        elif before is None and after is None:
-                            # No valid values to interpolate, use value
-                            country_data[year][col] = get_mean_val(row[col])
-                        elif before is None:
-                            country_data[year][col] = country_data[after][col]  # No before value so we use after
-                        else:
-                            country_data[year][col] = country_data[before][col]  # No after value so we use before
-    
-    return country_data  # Done with this country
-
-# Align data across all countries and years
-def align_data(df: pd.DataFrame) -> pd.DataFrame:
-    grouped = df.groupby('Countries, territories and areas')  # Group by country
-    aligned_data = []
-
-    for country, group in grouped:
-        group = group.sort_values('Year')  # Sort by year
-        country_data = process_country(group)  # Process data for this country
-        
-        for year, data in country_data.items():
-            row_data = {'Countries, territories and areas': country, 'Year': year}
-            row_data.update(data)
-            aligned_data.append(row_data)  # Add to final result
-    
-    result_df = pd.DataFrame(aligned_data)
-    result_df = result_df.sort_values(['Countries, territories and areas', 'Year'])  # Sort
+# (country, year) pairs are packed into one integer key so lookups are plain array searches
+YEAR_KEY_SPAN = 10000
+
+# Look up keys in a sorted key array, anything not found gets the default value instead
+def lookup_keys(keys: np.ndarray, known_keys: np.ndarray, known_values: np.ndarray,
+                default: np.ndarray) -> np.ndarray:
+    if len(known_keys) == 0:
+        return default
+    positions = np.minimum(np.searchsorted(known_keys, keys), len(known_keys) - 1)
+    return np.where(known_keys[positions] == keys, known_values[positions], default)
+
+# Expand the year ranges of every country at once. Single years are kept as they are, the years
+# of a range that have no single-year value are interpolated between the range's end points (the
+# range's own value stands in for an end point with no single-year value). Where ranges overlap
+# the first one in Year order wins. The exponent is only searched for a country/column where it
+# actually changes something, so nearly everything here is whole-array work.
+def expand_year_ranges(df: pd.DataFrame, search: Union[Dict, None] = None) -> pd.DataFrame:
+    search = {**SEARCH_SETTINGS, **(search or {})}
+    country_col = 'Countries, territories and areas'
+    df = df.sort_values([country_col, 'Year'], kind='mergesort')  # Sort by country then year
+    spans = parse_year_column(df['Year'])
+    valid = (spans['start'].notna() & df[country_col].notna()).to_numpy()
+    df, spans = df[valid], spans[valid]
+
+    codes, countries = pd.factorize(df[country_col], sort=True)
+    codes = codes.astype(np.int64)
+    start = spans['start'].to_numpy(np.int64)
+    end = spans['end'].to_numpy(np.int64)
+    is_range = end > start
+
+    # Explode every range row into one entry per year in a single go
+    range_rows = np.flatnonzero(is_range)
+    lengths = end[range_rows] - start[range_rows] + 1
+    exploded = np.repeat(range_rows, lengths)
+    exploded_year = start[exploded] + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    exploded_key = codes[exploded] * YEAR_KEY_SPAN + exploded_year
+
+    single_rows = np.flatnonzero(~is_range)
+    keys = np.unique(np.concatenate([codes[single_rows] * YEAR_KEY_SPAN + start[single_rows], exploded_key]))
+    result = {country_col: countries[keys // YEAR_KEY_SPAN], 'Year': keys % YEAR_KEY_SPAN}
+
+    for col, parsed in parse_indicator_columns(df).items():
+        values = parsed['mean'].to_numpy(float)
+        column = np.full(len(keys), np.nan)
+
+        # Single years, if a year shows up twice the later row wins
+        rows = single_rows[~np.isnan(values[single_rows])][::-1]
+        known_keys, first = np.unique(codes[rows] * YEAR_KEY_SPAN + start[rows], return_index=True)
+        known_values = values[rows][first]
+        column[np.searchsorted(keys, known_keys)] = known_values
+
+        # Range years that still need a value, each year only taken by the first range covering it
+        has_value = ~np.isnan(values[exploded])
+        need = has_value & ~np.isin(exploded_key, known_keys)
+        _, first = np.unique(exploded_key[need], return_index=True)
+        fill = np.flatnonzero(need)[np.sort(first)]
+        if len(fill) == 0:
+            result[col] = column
+            continue
+        rows = exploded[fill]
+        start_keys = codes[rows] * YEAR_KEY_SPAN + start[rows]
+        end_keys = codes[rows] * YEAR_KEY_SPAN + end[rows]
+        plan = {'year': exploded_year[fill].astype(float), 'start': start[rows].astype(float),
+                'end': end[rows].astype(float),
+                'start_value': lookup_keys(start_keys, known_keys, known_values, values[rows]),
+                'end_value': lookup_keys(end_keys, known_keys, known_values, values[rows])}
+
+        # The exponent only changes anything if a range is interpolating between two different values
+        exponent = np.full(len(fill), float(search['initial_exponent']))
+        fill_codes = codes[rows]
+        for code in np.unique(fill_codes[plan['start_value'] != plan['end_value']]):
+            in_country = fill_codes == code
+            lo, hi = np.searchsorted(known_keys, [code * YEAR_KEY_SPAN, (code + 1) * YEAR_KEY_SPAN])
+            range_values = values[range_rows[codes[range_rows] == code]]
+            objective = smoothness_objective((known_keys[lo:hi] % YEAR_KEY_SPAN).astype(float), known_values[lo:hi],
+                                             range_values[~np.isnan(range_values)],
+                                             {key: array[in_country] for key, array in plan.items()})
+            exponent[in_country] = hill_climbing(objective, **search)  # Optimise the exponent, once per country/column
+
+        column[np.searchsorted(keys, exploded_key[fill])] = apply_fill_plan(plan, exponent)
+        result[col] = column
+
+    return pd.DataFrame(result)
+
+# Align data across all countries and years. With workers > 1 the countries are split into
+# shards and expanded in a process pool, each country only ever lives in one shard
+def align_data(df: pd.DataFrame, search: Union[Dict, None] = None, workers: int = 1) -> pd.DataFrame:
+    country_col = 'Countries, territories and areas'
+    if workers > 1:
+        countries = df[country_col].dropna().unique()
+        shards = [df[df[country_col].isin(chunk)] for chunk in np.array_split(countries, workers) if len(chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            result_df = pd.concat(pool.map(expand_year_ranges, shards, [search] * len(shards)), ignore_index=True)
+    else:
+        result_df = expand_year_ranges(df, search)
+    result_df = result_df.sort_values([country_col, 'Year']).reset_index(drop=True)  # Sort
     
     # Reorder columns, moving breastfeeding-related ones to the end
     cols = list(result_df.columns)
@@ -136,11 +251,22 @@ def align_data(df: pd.DataFrame) -> pd.DataFrame:
     return result_df  
 
 def main():
+    parser = argparse.ArgumentParser(description='Clean merged_data.csv into cleaned_data.csv')
+    parser.add_argument('--workers', type=int, default=1, help='processes to shard countries across')
+    parser.add_argument('--strategy', choices=['hill', 'random', 'golden'], default=SEARCH_SETTINGS['strategy'],
+                        help='exponent search strategy')
+    args = parser.parse_args()
+
     input_file = 'merged_data.csv'  
     output_file = 'cleaned_data.csv'  
 
-    df = pd.read_csv(input_file) 
-    aligned_df = align_data(df)  
+    # Reuse the last result if merged_data.csv, the search settings and this file haven't changed
+    search = {**SEARCH_SETTINGS, 'strategy': args.strategy}
+    with stage_telemetry('hill_climbing') as telemetry:
+        telemetry.note(strategy=args.strategy, workers=args.workers)
+        aligned_df = telemetry.output(cached_stage(
+            'cleaned_data', [input_file], search,
+            lambda: align_data(telemetry.input(pd.read_csv(input_file)), search, workers=args.workers)))
     aligned_df.to_csv(output_file, index=False)  # Save to file for future reference
 
     # Let me know the script worked
@@ -0,0 +1,125 @@
+"""Hyperparameter search over the KNN imputation and the neural network settings, instead of
+trying n_neighbors / hidden layers / max_iter by hand one slow run at a time.
+
+Every n_neighbors value is imputed and scaled once by the same Preprocessor the shipped model uses
+(see preprocessing.py), fitted on the search's training rows only, and those matrices are saved
+in the artifact cache and shared by every network configuration with that n_neighbors. The network
+configurations are then trained across a process pool with successive halving: everything gets
+a small max_iter budget first, only the best 1/eta go on to the next rung with eta times the
+budget, and so on. Configurations are scored on a validation split carved out of the training
+set, the test set from NN_with_features.py is never touched.
+
+    python hyperparameter_search.py --neighbors 5 10 15 --workers 8"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import joblib
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.model_selection import train_test_split
+
+from artifact_cache import CACHE_DIR, stage_key
+from knn_imputation import impute_by_group
+from NN_with_features import FEATURES, TARGET, evaluate_model, load_and_prepare_data, train_neural_network
+from preprocessing import Preprocessor
+
+HIDDEN_LAYER_OPTIONS = [(100, 50), (64,), (128, 64), (64, 32, 16)]
+
+# Scaled train/validation matrices for one n_neighbors value: the same split as NN_with_features.py,
+# then a validation split out of its training part. The preprocessor is fitted on the rows the
+# networks train on and the validation rows only go through transform(), like the test rows of the
+# shipped model. Saved once per data file, settings and code, returns the file so workers can read it
+def prepared_split(data_file: str, n_neighbors: int, encoding: str) -> str:
+    params = {'features': FEATURES, 'target': TARGET, 'n_neighbors': n_neighbors, 'encoding': encoding}
+    code = [prepared_split, load_and_prepare_data, Preprocessor, impute_by_group]
+    path = os.path.join(CACHE_DIR, f"search_split-{stage_key('search_split', [data_file], params, code)}.joblib")
+    if os.path.exists(path):
+        return path
+
+    X, y = load_and_prepare_data(data_file, FEATURES, TARGET, encoding='sparse')
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=50)
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.2, random_state=50)
+    preprocessor = Preprocessor(FEATURES, encoding=encoding, n_neighbors=n_neighbors)
+    split = (preprocessor.fit_transform(X_fit, y_fit), preprocessor.impute_target(y_fit),
+             preprocessor.transform(X_val), preprocessor.impute_target(y_val))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'  # Same write-then-rename as cached_stage
+    joblib.dump(split, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+# The matrices of a prepared split, kept per worker process so a worker only reads each one
+# once however many configurations it trains
+_prepared: Dict[str, Tuple] = {}
+
+def prepare_split(path: str) -> Tuple:
+    if path not in _prepared:
+        _prepared[path] = joblib.load(path)
+    return _prepared[path]
+
+# Train one configuration with a max_iter budget and score it on the validation split
+def evaluate_config(config: Dict, budget: int, path: str) -> Dict:
+    X_fit, y_fit, X_val, y_val = prepare_split(path)
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)  # Expected on the small budgets
+        model = train_neural_network(X_fit, y_fit, hidden_layers=tuple(config['hidden_layers']), max_iter=budget)
+    mse, r2 = evaluate_model(model, X_val, y_val)
+    return {**config, 'max_iter': budget, 'val_mse': mse, 'val_r2': r2,
+            'fit_seconds': time.perf_counter() - start}
+
+# Successive halving over every configuration. Returns the results of every rung and the winner
+def successive_halving(configs: List[Dict], paths: Dict[int, str], min_budget: int, max_budget: int,
+                       eta: int, workers: int) -> Tuple[List[Dict], Dict]:
+    results, survivors, budget = [], configs, min_budget
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            rung = list(pool.map(evaluate_config, survivors, [budget] * len(survivors),
+                                 [paths[config['n_neighbors']] for config in survivors]))
+            rung.sort(key=lambda result: result['val_mse'])
+            results.extend(rung)
+            best = rung[0]
+            print(f"budget {budget:>5}: {len(rung):>3} configs, best val MSE {best['val_mse']:.4f} "
+                  f"(n_neighbors={best['n_neighbors']}, hidden_layers={tuple(best['hidden_layers'])})")
+            if budget >= max_budget or len(rung) == 1:
+                return results, best
+            keep = max(1, len(rung) // eta)
+            survivors = [{'n_neighbors': r['n_neighbors'], 'hidden_layers': r['hidden_layers']} for r in rung[:keep]]
+            budget = min(budget * eta, max_budget)
+
+def main():
+    parser = argparse.ArgumentParser(description='Successive halving search over imputation and MLP settings')
+    parser.add_argument('--data', default='cleaned_data.csv')
+    parser.add_argument('--neighbors', type=int, nargs='+', default=[5, 10, 15])
+    parser.add_argument('--encoding', choices=['onehot', 'sparse'], default='onehot')
+    parser.add_argument('--min-budget', type=int, default=50, help='max_iter given to every configuration first')
+    parser.add_argument('--max-budget', type=int, default=1000, help='max_iter of the final rung')
+    parser.add_argument('--eta', type=int, default=3, help='keep the best 1/eta of each rung')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='hyperparameter_search.json', help='where every rung result is saved')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = {n: prepared_split(args.data, n, args.encoding) for n in args.neighbors}
+    configs = [{'n_neighbors': n, 'hidden_layers': list(layers)}
+               for n, layers in itertools.product(args.neighbors, HIDDEN_LAYER_OPTIONS)]
+    rungs = math.ceil(math.log(args.max_budget / args.min_budget, args.eta)) + 1
+    print(f'{len(configs)} configurations, up to {rungs} rungs of successive halving on {args.workers} workers')
+
+    results, best = successive_halving(configs, paths, args.min_budget, args.max_budget, args.eta, args.workers)
+    with open(args.output, 'w') as f:
+        json.dump({'best': best, 'results': results}, f, indent=2)
+
+    print(f"\nBest: n_neighbors={best['n_neighbors']}, hidden_layers={tuple(best['hidden_layers'])}, "
+          f"max_iter={best['max_iter']} (val MSE {best['val_mse']:.4f}, R^2 {best['val_r2']:.4f})")
+    print(f'Search took {time.perf_counter() - start:.1f}s, results saved to {args.output}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""KNN imputation that scales with the number of rows. Running KNNImputer over the whole
+design matrix means working out NaN-euclidean distances between every pair of rows over
+~200 one-hot country columns, even though the one-hot columns only ever push a row towards
+rows of the same country. So instead the rows are split by country (or region) and the
+numeric columns are imputed inside each group, which is tiny. Anything a group can't fill
+on its own (e.g. a country with no breastfeeding data at all) is filled in a second pass
+against a capped sample of donor rows, with sklearn working through the distances in
+blocks of bounded size."""
+
+import numpy as np
+from sklearn import config_context
+from sklearn.impute import KNNImputer
+
+COUNTRY_PREFIX = 'Countries, territories and areas_'
+
+# Impute the columns of one block that have at least one observed value, the rest stay NaN
+def impute_block(values: np.ndarray, n_neighbors: int) -> np.ndarray:
+    observed = ~np.all(np.isnan(values), axis=0)
+    if observed.any():
+        values[:, observed] = KNNImputer(n_neighbors=n_neighbors).fit_transform(values[:, observed])
+    return values
+
+# Impute a numeric matrix group by group, then fill whatever is left from a sample of donor rows.
+# working_memory_mb caps how much memory sklearn uses for each block of distances, dtype=np.float32
+# halves the memory of the values (KNNImputer keeps float32 as it is)
+def impute_by_group(values: np.ndarray, groups: np.ndarray, n_neighbors: int = 10, max_donors: int = 5000,
+                    working_memory_mb: int = 64, seed: int = 50, dtype=np.float64) -> np.ndarray:
+    values = np.array(values, dtype=dtype)  # Copy, the caller's matrix is left alone
+    order = np.argsort(groups, kind='stable')
+    boundaries = np.flatnonzero(np.diff(groups[order])) + 1
+
+    with config_context(working_memory=working_memory_mb):
+        # First pass, every group on its own
+        for rows in np.split(order, boundaries):
+            block = values[rows]
+            if np.isnan(block).any():
+                values[rows] = impute_block(block, n_neighbors)
+
+        # Second pass for rows their own group couldn't fill
+        leftover = np.flatnonzero(np.isnan(values).any(axis=1))
+        if len(leftover):
+            donors = np.flatnonzero(~np.isnan(values).any(axis=1))
+            if len(donors) == 0:
+                donors = np.setdiff1d(np.arange(len(values)), leftover)
+            if len(donors) > max_donors:
+                donors = np.random.default_rng(seed).choice(donors, max_donors, replace=False)
+            usable = ~np.all(np.isnan(values[donors]), axis=0)
+            if len(donors) and usable.any():
+                imputer = KNNImputer(n_neighbors=n_neighbors).fit(values[np.ix_(donors, usable)])
+                values[np.ix_(leftover, usable)] = imputer.transform(values[np.ix_(leftover, usable)])
+    return values
@@ -0,0 +1,73 @@
+"""Loader for the WHO csv exports. The regional mortality files are read in parallel
+with a thread pool and their two-row header is flattened into proper column names
+e.g. 'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Both sexes', so nothing
+further down the line has to rename 'Unnamed: 0' style columns by position."""
+
+import argparse
+import csv
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+
+import pandas as pd
+
+REGIONAL_FILE_PATTERN = 'Child mortality rates_*.csv'
+NUTRITION_FILE = 'Infant nutrition data by country.csv'
+KEY_COLUMNS = ['Countries, territories and areas', 'Year']
+
+# Everything is read as a string: years can be ranges like "2015-2016" with a leading space and
+# the indicators are "mean [lo-hi]" cells, hill_climbing.py turns them into numbers later on
+WHO_DTYPE = 'string'
+
+# Join the two header rows, the group name on top and the sub-heading (e.g. " Male") below it
+def flatten_header(top: List[str], bottom: List[str]) -> List[str]:
+    names = []
+    for group, sub in zip(top, bottom):
+        group, sub = group.strip(), sub.strip()
+        names.append(f'{group} {sub}' if group else sub)
+    return names
+
+# Read one regional export, the header is read with the csv module so only the data rows go to pandas
+def read_regional_file(path: str) -> pd.DataFrame:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        columns = flatten_header(next(reader), next(reader))
+    return pd.read_csv(path, skiprows=2, header=None, names=columns,
+                       dtype={col: WHO_DTYPE for col in columns}, keep_default_na=False, na_values=[''])
+
+# Read the nutrition file, it only has the one header row
+def read_nutrition_file(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype=WHO_DTYPE, keep_default_na=False, na_values=[''])
+    df.columns = df.columns.str.strip()
+    return df
+
+# Read every regional file in the folder at the same time and stack them. Files are sorted by
+# name first so the row order doesn't depend on what order the OS lists them in
+def load_regional_files(data_dir: str, workers: Union[int, None] = None) -> pd.DataFrame:
+    files = sorted(glob.glob(os.path.join(data_dir, REGIONAL_FILE_PATTERN)))
+    if not files:
+        raise FileNotFoundError(f"No '{REGIONAL_FILE_PATTERN}' files found in {data_dir}")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(read_regional_file, files))
+
+    # All regions should share one layout, if not something has changed in the export
+    columns = list(frames[0].columns)
+    for path, frame in zip(files, frames):
+        if list(frame.columns) != columns:
+            raise ValueError(f'{os.path.basename(path)} has different columns to {os.path.basename(files[0])}')
+    return pd.concat(frames, ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stack the regional WHO mortality exports into one file')
+    parser.add_argument('--data-dir', default='.', help="folder holding the 'Child mortality rates_*.csv' files")
+    parser.add_argument('--output', default='all_mortality_rates.parquet', help='columnar output file')
+    parser.add_argument('--workers', type=int, default=None, help='threads used to read the files')
+    args = parser.parse_args()
+
+    mortality = load_regional_files(args.data_dir, args.workers)
+    mortality.to_parquet(args.output, index=False)
+    print(f"All mortality rates saved to '{args.output}' ({len(mortality)} rows).")
+
+if __name__ == "__main__":
+    main()
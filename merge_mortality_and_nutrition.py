@@ -1,44 +1,126 @@
 #This file merges the merged mortality data with nutritional data
 
 import pandas as pd
+import numpy as np
 import os
+from typing import Dict, List, Tuple, Union
+from artifact_cache import cached_stage
+from country_encoding import COUNTRY_COL, country_codes
+from country_registry import canonical_names
+from hill_climbing import YEAR_KEY_SPAN, parse_year_column
+from load_who_exports import read_nutrition_file
+from stage_telemetry import stage_telemetry
 
-# Use a generic path that expands to my home directory to remain anonymous
+# Use a generic path that expands to my home directory to remain anonymous, AAI_DATA_DIR overrides it
 home_dir = os.path.expanduser('~')
+data_dir = os.environ.get('AAI_DATA_DIR', os.path.join(home_dir, 'Desktop/AAI_2024_Datasets'))
+nutrition_path = os.path.join(data_dir, 'Infant nutrition data by country.csv')
+mortality_path = os.path.join(data_dir, 'all_mortality_rates.parquet')
 
-#  Load the datasets
-nutrition_data = pd.read_csv(os.path.join(home_dir, 'Desktop/AAI_2024_Datasets/Infant nutrition data by country.csv'))
-mortality_data = pd.read_csv(os.path.join(home_dir, 'Desktop/AAI_2024_Datasets/all_mortality_rates.csv'))
-
-# Rename 'Unnamed: 0' to 'Countries, territories and areas' and 'Unnamed: 1' to 'Year' in mortality data
-mortality_data.rename(columns={'Unnamed: 0': 'Countries, territories and areas', 
-                               'Unnamed: 1': 'Year'}, inplace=True)
-
-# Perform a full outer merge on 'Countries, territories and areas' and 'Year'
-merged_data = pd.merge(mortality_data, nutrition_data, 
-                       on=['Countries, territories and areas', 'Year'], 
-                       how='outer')
-
-# Define new column names directly
-new_column_names = [
-    'Countries, territories and areas', 
-    'Year', 
-    'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Both sexes', 
-    'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Male', 
-    'Under-five mortality rate (per 1000 live births) (SDG 3.2.1) Female', 
-    'Number of deaths among children under-five Both sexes', 
-    'Number of deaths among children under-five Male', 
-    'Number of deaths among children under-five Female', 
-    'Early initiation of breastfeeding (%)', 
-    'Infants exclusively breastfed for the first six months of life (%)'
-]
-
-# Assign new column names to the merged DataFrame
-merged_data.columns = new_column_names
-
-# Save this to a new file using a generic path
-intermediate_output_path = os.path.join(home_dir, 'Desktop/AAI_2024_Datasets/merged_data.csv')
-merged_data.to_csv(intermediate_output_path, index=False)
-
-# Print statement to show that the script has been successful
-print("All merged data saved.")  # To note, this is NOT fully cleaned data, error bars and year-ranges are not handled yet
+# Every row's join key as one integer: the country's code and the start and end year of its span,
+# so " 2015", "2015" and "2015 " are the same key and a range like "2015-2016" keeps both years.
+# Rows with no country or a year that isn't a year or a range come back as -1
+def join_keys(countries: pd.Series, years: pd.Series, categories) -> np.ndarray:
+    codes = country_codes(countries, categories).astype(np.int64)
+
+    # Only the distinct year strings are parsed, there are far fewer of them than rows
+    year_codes, year_values = pd.factorize(years)
+    spans = parse_year_column(pd.Series(year_values, dtype='string'))
+    start = np.append(spans['start'].fillna(-1).to_numpy(np.int64), -1)[year_codes]  # Code -1 is a missing year
+    end = np.append(spans['end'].fillna(-1).to_numpy(np.int64), -1)[year_codes]
+    valid = (codes >= 0) & (start >= 0)
+    return np.where(valid, (codes * YEAR_KEY_SPAN + start) * YEAR_KEY_SPAN + end, -1)
+
+# Full outer join of any number of indicator frames on (country, year span). Countries get the WHO
+# spelling (country_registry.py) and become integer codes, years become integer spans, and then
+# each frame is sorted by its keys and placed into the sorted union of every frame's keys, so adding
+# another indicator file is one more sort rather than another string merge. If a country-year shows
+# up twice in one frame the later row wins (like hill_climbing.py), rows without a usable country
+# or year are left out. Returns the merged frame and the match/miss statistics of every frame
+def merge_indicator_frames(frames: List[pd.DataFrame], names: Union[List[str], None] = None) -> Tuple[pd.DataFrame, Dict]:
+    names = names or [f'frame_{i}' for i in range(len(frames))]
+    value_columns = [[col for col in frame.columns if col not in (COUNTRY_COL, 'Year')] for frame in frames]
+    for i, columns in enumerate(value_columns):
+        for j in range(i):
+            clash = set(columns) & set(value_columns[j])
+            if clash:
+                raise ValueError(f'{names[i]} and {names[j]} both have the columns {sorted(clash)}')
+
+    countries = [canonical_names(frame[COUNTRY_COL]) for frame in frames]
+    categories = sorted(set().union(*(country.dropna().unique() for country in countries)))
+    keys = [join_keys(country, frame['Year'], categories) for country, frame in zip(countries, frames)]
+
+    # Each frame's usable rows sorted by key, the last row of a repeated key kept
+    sorted_rows, frame_keys = [], []
+    for key in keys:
+        rows = np.flatnonzero(key >= 0)
+        rows = rows[np.argsort(key[rows], kind='stable')]
+        last = np.append(key[rows[1:]] != key[rows[:-1]], True)
+        sorted_rows.append(rows[last])
+        frame_keys.append(key[rows[last]])
+
+    # The union of the sorted key lists, a stable sort only has to merge the already sorted runs
+    all_keys = np.sort(np.concatenate(frame_keys), kind='stable')
+    all_keys = all_keys[np.append(True, all_keys[1:] != all_keys[:-1])]
+
+    # Key columns back from the integers, single years as "2015" and ranges as "2015-2016". Labels are
+    # made once per distinct country and span and then repeated
+    spans, span_ids = np.unique(all_keys % YEAR_KEY_SPAN ** 2, return_inverse=True)
+    labels = [f'{span // YEAR_KEY_SPAN}' if span // YEAR_KEY_SPAN == span % YEAR_KEY_SPAN
+              else f'{span // YEAR_KEY_SPAN}-{span % YEAR_KEY_SPAN}' for span in spans.tolist()]
+    merged = {COUNTRY_COL: pd.array(categories, dtype='string').take(all_keys // YEAR_KEY_SPAN ** 2),
+              'Year': pd.array(labels, dtype='string').take(span_ids)}
+
+    # Each frame's rows into their place in the union, -1 (a key the frame doesn't have) gives an empty cell
+    in_frames = np.zeros(len(all_keys), dtype=np.int64)
+    positions = []
+    for frame, rows, unique_keys, columns in zip(frames, sorted_rows, frame_keys, value_columns):
+        position = np.searchsorted(all_keys, unique_keys)
+        positions.append(position)
+        in_frames[position] += 1
+        take = np.full(len(all_keys), -1)
+        take[position] = rows
+        merged.update({col: pd.api.extensions.take(frame[col].array, take, allow_fill=True) for col in columns})
+
+    stats = {'keys': len(all_keys), 'matched_in_every_frame': int((in_frames == len(frames)).sum()), 'frames': {}}
+    for name, frame, key, unique_keys, position in zip(names, frames, keys, frame_keys, positions):
+        spans = unique_keys % YEAR_KEY_SPAN != unique_keys // YEAR_KEY_SPAN % YEAR_KEY_SPAN
+        stats['frames'][name] = {
+            'rows': len(frame), 'unusable_rows': int((key < 0).sum()),
+            'repeated_rows': int((key >= 0).sum() - len(unique_keys)), 'ranges': int(spans.sum()),
+            'matched': int((in_frames[position] > 1).sum()), 'unmatched': int((in_frames[position] == 1).sum())}
+    return pd.DataFrame(merged), stats
+
+# Print the statistics of merge_indicator_frames
+def print_merge_stats(stats: Dict) -> None:
+    print(f"{stats['keys']} country-years, {stats['matched_in_every_frame']} of them in every file")
+    for name, frame in stats['frames'].items():
+        print(f"  {name:<12} rows {frame['rows']:>7}  matched {frame['matched']:>7}  unmatched {frame['unmatched']:>6}  "
+              f"(ranges {frame['ranges']}, repeated {frame['repeated_rows']}, unusable {frame['unusable_rows']})")
+
+# Full outer merge of the mortality and the nutrition data on country and year (see merge_indicator_frames)
+def merge_mortality_and_nutrition(mortality_data, nutrition_data, report=False):
+    merged, stats = merge_indicator_frames([mortality_data, nutrition_data], ['mortality', 'nutrition'])
+    if report:
+        print_merge_stats(stats)
+    return merged
+
+# Load the datasets (the mortality file already has proper column names from load_who_exports.py) and merge them
+def merge_datasets():
+    return merge_mortality_and_nutrition(pd.read_parquet(mortality_path), read_nutrition_file(nutrition_path),
+                                         report=True)
+
+# Only run the merge when this file is run directly, so the merge function can be imported (e.g. for benchmarks)
+if __name__ == "__main__":
+    # Only redo the merge if one of the two input files (or the merging code) has changed
+    with stage_telemetry('merge_mortality_and_nutrition') as telemetry:
+        merged_data = telemetry.output(cached_stage(
+            'merged_data', [mortality_path, nutrition_path], {}, merge_datasets,
+            code=[merge_datasets, country_codes, canonical_names, parse_year_column, read_nutrition_file]))
+
+    # Save this to a new file using a generic path
+    intermediate_output_path = os.path.join(data_dir, 'merged_data.csv')
+    merged_data.to_csv(intermediate_output_path, index=False)
+
+    # Print statement to show that the script has been successful
+    print("All merged data saved.")  # To note, this is NOT fully cleaned data, error bars and year-ranges are not handled yet
@@ -1,25 +1,22 @@
 #This file merges all mortality rates together
 
-import pandas as pd
-import glob
 import os
+from load_who_exports import load_regional_files
+from stage_telemetry import stage_telemetry
 
 # Use a generic path that expands to my home directory to remain anonymous
 home_dir = os.path.expanduser('~')
 
-# Path to the folder containing your CSV files
-path = os.path.join(home_dir, 'Desktop/AAI_2024_Datasets/Child mortality rates_*.csv')
+# Path to the folder containing your CSV files, AAI_DATA_DIR overrides it (run_pipeline.py sets this)
+data_dir = os.environ.get('AAI_DATA_DIR', os.path.join(home_dir, 'Desktop/AAI_2024_Datasets'))
 
-# List all CSV files matching the pattern
-all_files = glob.glob(path)
+# Read all the regional CSV files at once (thread pool) with their two-row header flattened
+with stage_telemetry('merge_mortality_rates') as telemetry:
+    merged_df = telemetry.output(load_regional_files(data_dir))
 
-# Read and concatenate all CSV files
-df_list = [pd.read_csv(file) for file in all_files]
-merged_df = pd.concat(df_list, ignore_index=True)
-
-# Save the merged CSV to a generic path
-output_path = os.path.join(home_dir, 'Desktop/AAI_2024_Datasets/all_mortality_rates.csv')
-merged_df.to_csv(output_path, index=False)
+# Save the merged data as parquet so the column names and types come back exactly as saved
+output_path = os.path.join(data_dir, 'all_mortality_rates.parquet')
+merged_df.to_parquet(output_path, index=False)
 
 # Print statement to show that the script has been successful
 print("All mortality rates saved.")
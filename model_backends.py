@@ -0,0 +1,106 @@
+"""The models the pipeline can train, by name, so NN_with_features.py / NN_no_features.py aren't tied to
+MLPRegressor. Each backend builds an unfitted sklearn regressor from keyword settings; anything not
+given falls back to the backend's defaults (for 'mlp' the settings train_neural_network always used).
+
+- mlp: the original neural network
+- hist_gradient_boosting: HistGradientBoostingRegressor, trees usually suit a few tabular features
+  better and fit in seconds. It needs a dense matrix, so a sparse one is expanded first
+- ridge: linear regression with an L2 penalty, works straight on the sparse country encoding
+
+Given several target columns at once (NN_with_features.py --all-targets) train_model builds a
+multi-target model instead, see build_multi_target_model. Count columns listed in log_targets (the
+death counts) are learnt as log(1 + count) there, see log_targets_transformer.
+
+    python NN_with_features.py --model ridge --model-params '{"alpha": 0.1}'
+    python compare_models.py   # fit time, throughput, MSE and R^2 of every backend side by side"""
+
+import json
+from typing import Callable, Dict, Union
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import FunctionTransformer, StandardScaler
+
+# Sparse design matrices are expanded for models that only take dense input
+def to_dense(X):
+    return X.toarray() if sp.issparse(X) else X
+
+def build_mlp(hidden_layers=(100, 50), max_iter=1000, random_state=50, **params):
+    return MLPRegressor(hidden_layer_sizes=tuple(hidden_layers), max_iter=max_iter, random_state=random_state, **params)
+
+def build_hist_gradient_boosting(max_iter=300, learning_rate=0.1, random_state=50, **params):
+    return make_pipeline(FunctionTransformer(to_dense, accept_sparse=True),
+                         HistGradientBoostingRegressor(max_iter=max_iter, learning_rate=learning_rate,
+                                                       random_state=random_state, **params))
+
+def build_ridge(alpha=1.0, **params):
+    return Ridge(alpha=alpha, **params)
+
+MODEL_BACKENDS: Dict[str, Callable] = {
+    'mlp': build_mlp,
+    'hist_gradient_boosting': build_hist_gradient_boosting,
+    'ridge': build_ridge,
+}
+
+# Backends that only predict one column at a time
+SINGLE_OUTPUT_BACKENDS = {'hist_gradient_boosting'}
+
+# How each backend is called in printed results
+MODEL_LABELS = {'mlp': 'Neural Network', 'hist_gradient_boosting': 'Gradient Boosting', 'ridge': 'Ridge'}
+
+# Unfitted model of a backend, settings override the backend's defaults
+def build_model(backend: str, **params):
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', choose from {', '.join(MODEL_BACKENDS)}")
+    return MODEL_BACKENDS[backend](**params)
+
+# log(1 + y) of the given target columns and back, the other columns are left as they are
+def log_columns(y, columns=()):
+    y = np.array(y, dtype=np.float64)
+    y[:, list(columns)] = np.log1p(y[:, list(columns)])
+    return y
+
+def exp_columns(y, columns=()):
+    y = np.array(y, dtype=np.float64)
+    y[:, list(columns)] = np.expm1(y[:, list(columns)])
+    return y
+
+# The death counts go from a handful (Iceland) to hundreds of thousands (India) a year, so on their own
+# scale an error of a few thousand is nothing for the loss and small countries come out as noise, even
+# below zero. In log space the model gets every country's count about equally right, relatively
+def log_targets_transformer(columns) -> Pipeline:
+    return Pipeline([('log', FunctionTransformer(log_columns, inverse_func=exp_columns, kw_args={'columns': list(columns)},
+                                                 inv_kw_args={'columns': list(columns)}, check_inverse=False)),
+                     ('scale', StandardScaler())])
+
+# One model for several target columns. The targets are standardised for training and turned back on
+# predict, so the death counts don't outweigh the rates in the loss just for being bigger numbers.
+# The columns at the positions in log_targets are also taken to log space first.
+# The MLP and ridge predict every column from one pass, gradient boosting gets one model per column
+def build_multi_target_model(backend: str, log_targets=(), **params):
+    model = build_model(backend, **params)
+    if backend in SINGLE_OUTPUT_BACKENDS:
+        model = MultiOutputRegressor(model)
+    return TransformedTargetRegressor(regressor=model, transformer=log_targets_transformer(log_targets))
+
+# Build and fit in one go, the backend version of train_neural_network. A y with several columns
+# gets the multi-target model
+def train_model(backend: str, X_train, y_train, log_targets=(), **params):
+    if np.ndim(y_train) > 1:
+        return build_multi_target_model(backend, log_targets, **params).fit(X_train, y_train)
+    return build_model(backend, **params).fit(X_train, y_train)
+
+# Settings given on the command line as a JSON object, e.g. '{"alpha": 0.1}'
+def parse_model_params(text: Union[str, None]) -> Dict:
+    if not text:
+        return {}
+    params = json.loads(text)
+    if not isinstance(params, dict):
+        raise ValueError(f"Model settings must be a JSON object, got '{text}'")
+    return params
@@ -0,0 +1,67 @@
+"""Save everything a prediction needs after training (model, fitted preprocessor and the
+(country, year) breastfeeding lookup) into one folder, so predictions don't mean re-running
+NN_with_features.py from the top. The lookup is stored as plain .npy arrays and loaded
+memory-mapped, so loading a bundle doesn't read the whole table up front.
+
+Save one with: python NN_with_features.py --save-bundle model_bundle"""
+
+import json
+import os
+from typing import Dict, List, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from NN_with_features import EARLY_COL, EXCLUSIVE_COL, predict_mortality_rates
+from numpy_inference import EXPORT_FILE, export_mlp
+
+BUNDLE_VERSION = 2
+
+# Write the bundle folder, 'lookup' is the frame from build_feature_lookup
+# and the defaults are the breastfeeding values used for a country-year that isn't in the lookup
+# The preprocessor (see preprocessing.py) carries the scaler, the imputer and the column layout
+def save_bundle(path: str, model, preprocessor, lookup: pd.DataFrame, features: List[str], target: Union[str, List[str]],
+                defaults: Dict[str, float]) -> None:
+    os.makedirs(path, exist_ok=True)
+    joblib.dump({'model': model, 'preprocessor': preprocessor}, os.path.join(path, 'model.joblib'))
+
+    # The MLP also goes into a NumPy-only float32 file that prediction_server.py can run without sklearn
+    if hasattr(getattr(model, 'regressor_', model), 'coefs_'):
+        export_mlp(os.path.join(path, EXPORT_FILE), model, preprocessor, lookup, defaults, target)
+
+    # Countries are stored as codes into a name list, years and values as plain arrays
+    country_codes, country_names = pd.factorize(lookup.index.get_level_values(0))
+    np.save(os.path.join(path, 'lookup_countries.npy'), country_codes.astype(np.int32))
+    np.save(os.path.join(path, 'lookup_years.npy'), lookup.index.get_level_values(1).to_numpy(np.int32))
+    np.save(os.path.join(path, 'lookup_values.npy'), lookup[[EARLY_COL, EXCLUSIVE_COL]].to_numpy(np.float64))
+
+    layout = {'version': BUNDLE_VERSION, 'features': features, 'target': target, 'defaults': defaults,
+              'lookup_country_names': list(country_names)}
+    with open(os.path.join(path, 'layout.json'), 'w') as f:
+        json.dump(layout, f)
+
+# Load a bundle folder back, the lookup arrays are memory-mapped rather than read in
+def load_bundle(path: str) -> Dict:
+    with open(os.path.join(path, 'layout.json')) as f:
+        layout = json.load(f)
+    if layout['version'] != BUNDLE_VERSION:
+        raise ValueError(f"Bundle version {layout['version']} isn't supported (expected {BUNDLE_VERSION})")
+    fitted = joblib.load(os.path.join(path, 'model.joblib'))
+
+    codes = np.load(os.path.join(path, 'lookup_countries.npy'), mmap_mode='r')
+    years = np.load(os.path.join(path, 'lookup_years.npy'), mmap_mode='r')
+    values = np.load(os.path.join(path, 'lookup_values.npy'), mmap_mode='r')
+    index = pd.MultiIndex.from_arrays([np.asarray(layout['lookup_country_names'], dtype=object)[codes], years])
+    lookup = pd.DataFrame(values, index=index, columns=[EARLY_COL, EXCLUSIVE_COL], copy=False)
+    return {**layout, **fitted, 'lookup': lookup}
+
+# Batch prediction straight from a loaded bundle, NaN breastfeeding values fall back to the bundle defaults
+def predict_from_bundle(bundle: Dict, countries, years, breastfeeding_early=np.nan, breastfeeding_exclusive=np.nan,
+                        override: bool = False) -> np.ndarray:
+    early = np.asarray(breastfeeding_early, dtype=float)
+    exclusive = np.asarray(breastfeeding_exclusive, dtype=float)
+    early = np.where(np.isnan(early), bundle['defaults'][EARLY_COL], early)
+    exclusive = np.where(np.isnan(exclusive), bundle['defaults'][EXCLUSIVE_COL], exclusive)
+    return predict_mortality_rates(countries, years, bundle['model'], bundle['preprocessor'], bundle['lookup'],
+                                   early, exclusive, override)
@@ -0,0 +1,221 @@
+"""Predictions from the trained MLP with nothing but NumPy. Going through the model bundle means
+importing sklearn and pandas (a second or more before the first prediction) and every predict call
+validates a DataFrame and works in float64. The exporter here writes the network's weights into one
+float32 .npz file that this module loads and runs on its own, it never imports sklearn or pandas.
+
+At export the preprocessing is folded into the first layer, so a prediction is just matrix products:
+- the scaler: (x - mean) / scale @ W is the same as x @ (W / scale) - (mean / scale) @ W, so the
+  scaled weights and a shifted bias are stored and raw feature values go straight in
+- the country one-hot: multiplying a one-hot row by W only picks out that country's row of W, so
+  every country's row is stored as a table and looked up by code instead of multiplied
+- the (country, year) breastfeeding lookup and the defaults from the bundle come along too, and so
+  do the other spellings country_registry.py knows for the model's countries ('Turkey' -> 'Turkiye'),
+  a country the model wasn't trained on is a KeyError like on the sklearn path
+- a multi-target model (NN_with_features.py --all-targets) is the MLP inside a target scaler, that
+  scaler goes into the output layer the same way and a prediction has a column per target. The
+  death counts it learns as log(1 + count) are turned back with expm1 after the output layer
+
+The bundle writes the export as mlp_float32.npz when the model is the MLP, and prediction_server.py
+uses it when it's there. For an older bundle: python numpy_inference.py export model_bundle
+To check it against the sklearn path: python numpy_inference.py compare model_bundle"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Union
+
+import numpy as np
+
+EXPORT_FILE = 'mlp_float32.npz'
+EARLY_COL = 'Early initiation of breastfeeding (%)'
+EXCLUSIVE_COL = 'Infants exclusively breastfed for the first six months of life (%)'
+YEAR_KEY = 100000  # (country, year) lookup keys are country_id * YEAR_KEY + year
+
+ACTIVATIONS = {
+    'identity': lambda h: h,
+    'relu': lambda h: np.maximum(h, 0, out=h),
+    'tanh': lambda h: np.tanh(h, out=h),
+    'logistic': lambda h: 1 / (1 + np.exp(-h)),
+}
+
+# Write the fitted MLPRegressor and its preprocessor (see preprocessing.py) to one float32 .npz file.
+# Only reads their attributes, so this module still doesn't need sklearn
+def export_mlp(path: str, model, preprocessor, lookup, defaults: Dict[str, float], target: Union[str, List[str]]) -> None:
+    target_scaler = getattr(model, 'transformer_', None)
+    log_targets = []
+    if hasattr(target_scaler, 'steps'):  # The scaler behind the log of the death counts
+        log_targets = list(target_scaler.named_steps['log'].kw_args['columns'])
+        target_scaler = target_scaler.named_steps['scale']
+    model = getattr(model, 'regressor_', model)
+    features = list(preprocessor.features)
+    if features != ['Year', EARLY_COL, EXCLUSIVE_COL]:
+        raise ValueError(f'Only the breastfeeding model can be exported, got features {features}')
+    if model.activation not in ACTIVATIONS:
+        raise ValueError(f"Unknown activation '{model.activation}'")
+    n_numeric = len(features)
+    weights = [np.asarray(W, dtype=np.float64) for W in model.coefs_]
+    biases = [np.asarray(b, dtype=np.float64) for b in model.intercepts_]
+    mean, scale = preprocessor.scaler_.mean_, preprocessor.scaler_.scale_
+
+    # Undo the target scaling in the output layer: y = out * scale + mean
+    if target_scaler is not None:
+        weights[-1] = weights[-1] * target_scaler.scale_
+        biases[-1] = biases[-1] * target_scaler.scale_ + target_scaler.mean_
+
+    # Fold the scaler of the numeric features into the first layer
+    first = weights[0]
+    numeric_weights = first[:n_numeric] / scale[:n_numeric, None]
+    first_bias = biases[0] - (mean[:n_numeric] / scale[:n_numeric]) @ first[:n_numeric]
+    country_weights = first[n_numeric:]
+    if preprocessor.encoding == 'onehot':
+        # The dense one-hot columns went through the scaler too
+        first_bias = first_bias - (mean[n_numeric:] / scale[n_numeric:]) @ country_weights
+        country_weights = country_weights / scale[n_numeric:, None]
+
+    # One name list for the model's countries and the lookup's, the extra last row is for unknown countries
+    model_countries = list(preprocessor.categories_)
+    lookup_countries = lookup.index.get_level_values(0).astype(str)
+    names = sorted(set(model_countries) | set(lookup_countries))
+    model_code = {country: code for code, country in enumerate(model_countries)}
+    country_rows = np.zeros((len(names) + 1, first.shape[1]))
+    for country_id, country in enumerate(names):
+        if country in model_code:
+            country_rows[country_id] = country_weights[model_code[country]]
+
+    name_id = {country: country_id for country_id, country in enumerate(names)}
+    keys = np.array([name_id[country] for country in lookup_countries], dtype=np.int64) * YEAR_KEY
+    keys += lookup.index.get_level_values(1).to_numpy(np.int64)
+    order = np.argsort(keys, kind='stable')
+
+    arrays = {'numeric_weights': numeric_weights, 'first_bias': first_bias, 'country_rows': country_rows}
+    for layer, (W, b) in enumerate(zip(weights[1:], biases[1:]), start=1):
+        arrays[f'W{layer}'], arrays[f'b{layer}'] = W, b
+    arrays = {name: values.astype(np.float32) for name, values in arrays.items()}
+    arrays['lookup_keys'] = keys[order]
+    arrays['lookup_values'] = lookup[[EARLY_COL, EXCLUSIVE_COL]].to_numpy(np.float32)[order]
+    arrays['countries'] = np.array(names, dtype=str)
+    arrays['known'] = np.append(np.isin(names, model_countries), False)  # Countries the model was trained on
+
+    from country_registry import spellings
+    aliases = {spelling: name for spelling, name in spellings().items() if name in model_code}
+    meta = {'activation': model.activation, 'layers': len(weights), 'features': features, 'target': target,
+            'defaults': {EARLY_COL: float(defaults[EARLY_COL]), EXCLUSIVE_COL: float(defaults[EXCLUSIVE_COL])},
+            'aliases': aliases, 'log_targets': log_targets}
+    np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+# Load an exported file into a dict like load_bundle does, everything read up front
+def load_engine(path: str) -> Dict:
+    if os.path.isdir(path):
+        path = os.path.join(path, EXPORT_FILE)
+    with np.load(path) as data:
+        engine = {name: data[name] for name in data.files}
+    engine.update(json.loads(str(engine.pop('meta'))))
+    names = engine['countries'].tolist()
+    engine['country_ids'] = {country: country_id for country_id, country in enumerate(names)}
+    engine.setdefault('aliases', {})
+    engine.setdefault('log_targets', [])
+    if 'known' not in engine:  # Exported before unknown countries were checked
+        engine['known'] = np.append(np.ones(len(names), dtype=bool), False)
+    engine['layer_weights'] = [(engine[f'W{layer}'], engine[f'b{layer}']) for layer in range(1, engine['layers'])]
+    return engine
+
+# The network on raw feature values (Year, early, exclusive columns) and country ids from engine['country_ids']
+def forward(engine: Dict, numeric: np.ndarray, country_ids: np.ndarray) -> np.ndarray:
+    activation = ACTIVATIONS[engine['activation']]
+    hidden = numeric @ engine['numeric_weights']
+    hidden += engine['country_rows'][country_ids]
+    hidden += engine['first_bias']
+    for W, b in engine['layer_weights']:
+        hidden = activation(hidden)
+        hidden = hidden @ W
+        hidden += b
+    # The output layer of a regressor has no activation, a multi-target model keeps a column per target
+    if engine['log_targets']:
+        hidden[:, engine['log_targets']] = np.expm1(hidden[:, engine['log_targets']])
+    return hidden.ravel() if hidden.shape[1] == 1 else hidden
+
+# Same inputs and results as model_bundle.predict_from_bundle: breastfeeding values come from the
+# lookup unless override is set, and anything still NaN falls back to the defaults
+def predict_engine(engine: Dict, countries: List[str], years, breastfeeding_early=np.nan,
+                   breastfeeding_exclusive=np.nan, override: bool = False) -> np.ndarray:
+    unknown = len(engine['country_ids'])
+    names = [str(country).strip() for country in countries]
+    names = [engine['aliases'].get(name.casefold(), name) for name in names]
+    country_ids = np.array([engine['country_ids'].get(name, unknown) for name in names], dtype=np.int64)
+    known = engine['known'][country_ids]
+    if not known.all():
+        raise KeyError(f'Unknown countries: {sorted({name for name, ok in zip(names, known) if not ok})}')
+    years = np.asarray(years, dtype=np.int64)
+    early = np.broadcast_to(np.asarray(breastfeeding_early, dtype=np.float32), years.shape).copy()
+    exclusive = np.broadcast_to(np.asarray(breastfeeding_exclusive, dtype=np.float32), years.shape).copy()
+    early[np.isnan(early)] = engine['defaults'][EARLY_COL]
+    exclusive[np.isnan(exclusive)] = engine['defaults'][EXCLUSIVE_COL]
+
+    if not override and len(engine['lookup_keys']):
+        keys = country_ids * YEAR_KEY + years
+        positions = np.minimum(np.searchsorted(engine['lookup_keys'], keys), len(engine['lookup_keys']) - 1)
+        found = engine['lookup_keys'][positions] == keys
+        early[found] = engine['lookup_values'][positions[found], 0]
+        exclusive[found] = engine['lookup_values'][positions[found], 1]
+
+    numeric = np.column_stack([years.astype(np.float32), early, exclusive])
+    return np.maximum(forward(engine, numeric, country_ids), 0)  # Clipped at 0 like predict_mortality_rates
+
+# Export the MLP of an existing bundle folder
+def export_bundle(bundle_dir: str) -> str:
+    from model_bundle import load_bundle
+    bundle = load_bundle(bundle_dir)
+    path = os.path.join(bundle_dir, EXPORT_FILE)
+    export_mlp(path, bundle['model'], bundle['preprocessor'], bundle['lookup'], bundle['defaults'], bundle['target'])
+    return path
+
+# Cold start and batch latency of both paths on the same random country-years, and how far apart they are
+def compare(bundle_dir: str, rows: int, repeats: int) -> None:
+    start = time.perf_counter()
+    engine = load_engine(bundle_dir)
+    numpy_load = time.perf_counter() - start
+    start = time.perf_counter()
+    from model_bundle import load_bundle, predict_from_bundle
+    bundle = load_bundle(bundle_dir)
+    sklearn_load = time.perf_counter() - start
+
+    rng = np.random.default_rng(50)
+    picks = rng.integers(0, len(bundle['lookup']), rows)
+    countries = bundle['lookup'].index.get_level_values(0)[picks].tolist()
+    years = bundle['lookup'].index.get_level_values(1)[picks] + rng.integers(-2, 3, rows)  # Some aren't in the lookup
+
+    timings = {}
+    for name, predict in [('sklearn', lambda: predict_from_bundle(bundle, countries, years)),
+                          ('numpy', lambda: predict_engine(engine, countries, years))]:
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predictions = predict()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = (best, predictions)
+
+    difference = np.abs(timings['numpy'][1] - timings['sklearn'][1])
+    print(f'load (incl. imports)  sklearn {sklearn_load:.3f}s   numpy {numpy_load:.3f}s')
+    print(f'{rows} predictions    sklearn {1000 * timings["sklearn"][0]:.2f}ms   '
+          f'numpy {1000 * timings["numpy"][0]:.2f}ms')
+    print(f'largest difference {difference.max():.5f}, mean {difference.mean():.5f}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the MLP of a model bundle for NumPy-only predictions')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help=f'write {EXPORT_FILE} into a bundle folder')
+    export_parser.add_argument('bundle')
+    compare_parser = commands.add_parser('compare', help='speed and agreement against the sklearn bundle')
+    compare_parser.add_argument('bundle')
+    compare_parser.add_argument('--rows', type=int, default=10000)
+    compare_parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(f'Exported to {export_bundle(args.bundle)}')
+    else:
+        compare(args.bundle, args.rows, args.repeats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Shared way of showing or saving the figures of the visualisation scripts. Every script turns
+its data into a list of figure jobs (a drawing function, its arguments and a file name), then:
+
+- without --output-dir every figure is drawn and shown one after the other like before
+- with --output-dir nothing opens a window: the jobs are drawn with the Agg backend across a
+  process pool and written to the folder as PNG and/or SVG, so the whole report set can be
+  regenerated in a batch job
+
+    python error_bar_data_plotted.py --output-dir figures --format png svg --workers 4"""
+
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import matplotlib
+
+# (function that draws one figure and returns it, its arguments, file name without extension)
+FigureJob = Tuple[Callable, tuple, str]
+
+# The command line options every visualisation script shares
+def rendering_arguments(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output-dir', help='save every figure to this folder instead of showing it')
+    parser.add_argument('--format', nargs='+', choices=['png', 'svg', 'pdf'], default=['png'], dest='formats',
+                        help='file formats to save (with --output-dir)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes drawing figures at once')
+    parser.add_argument('--dpi', type=int, default=100)
+    return parser
+
+# A title turned into a file name, e.g. 'Early Initiation of Breastfeeding in Europe' -> early_initiation_of_...
+def figure_name(title: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', title.lower()).strip('_')
+
+# Draw one job and save it in every format, runs inside the worker processes
+def render_job(job: FigureJob, output_dir: str, formats: Sequence[str], dpi: int) -> List[str]:
+    import matplotlib.pyplot as plt
+    draw, args, name = job
+    figure = draw(*args)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f'{name}.{fmt}')
+        figure.savefig(path, format=fmt, dpi=dpi)
+        paths.append(path)
+    plt.close(figure)
+    return paths
+
+def use_agg_backend():
+    matplotlib.use('Agg', force=True)
+
+# Show the figures one at a time, or save them all when there's an output folder
+def show_or_save(jobs: List[FigureJob], output_dir: Optional[str] = None, formats: Sequence[str] = ('png',),
+                 workers: int = 1, dpi: int = 100) -> List[str]:
+    import matplotlib.pyplot as plt
+    if output_dir is None:
+        for draw, args, _ in jobs:
+            draw(*args)
+            plt.show()
+        return []
+
+    use_agg_backend()
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or 1, len(jobs)))
+    if workers == 1:
+        saved = [render_job(job, output_dir, formats, dpi) for job in jobs]
+    else:
+        # Figures are independent, so each worker just draws whichever job is next
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_agg_backend) as pool:
+            saved = list(pool.map(render_job, jobs, [output_dir] * len(jobs), [formats] * len(jobs),
+                                  [dpi] * len(jobs)))
+    paths = [path for job_paths in saved for path in job_paths]
+    print(f"{len(paths)} figures saved to '{output_dir}'")
+    return paths
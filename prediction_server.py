@@ -0,0 +1,133 @@
+"""Small local prediction server around a saved model bundle (see model_bundle.py), so a
+dashboard can ask for predictions without anything being retrained. Repeated questions are
+answered from an LRU cache.
+
+    python prediction_server.py --bundle model_bundle predict Afghanistan 2015
+    python prediction_server.py --bundle model_bundle serve --port 8000
+
+The server answers GET /predict?country=Afghanistan&year=2015 (optionally &early=60&exclusive=50,
+used when there's no data for that country-year) and POST /predict with a JSON body like
+{"countries": ["Afghanistan", "Brazil"], "years": [2015, 2015]} for batches. Other spellings of a
+country ('Turkey') are put into the WHO one, a country the model doesn't know is a 400 response
+(an error message and exit code 1 for the predict command).
+
+When the bundle has the NumPy export of the MLP (see numpy_inference.py) predictions go through
+that instead, which starts up without importing sklearn or pandas. --engine sklearn forces the
+sklearn model."""
+
+import argparse
+import json
+import math
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import sys
+from typing import Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from numpy_inference import EXPORT_FILE, load_engine, predict_engine
+
+# The bundle and its batch prediction function for an engine. The sklearn one is only imported
+# when it's used, importing it is most of the start-up time
+def load_predictor(bundle_dir: str, engine: str = 'auto'):
+    if engine == 'numpy' or (engine == 'auto' and os.path.exists(os.path.join(bundle_dir, EXPORT_FILE))):
+        return load_engine(bundle_dir), predict_engine
+    from model_bundle import load_bundle, predict_from_bundle
+    return load_bundle(bundle_dir), predict_from_bundle
+
+# Single predictions go through an LRU cache. None for a breastfeeding value means use the bundle's
+# default (None rather than NaN because NaN never equals itself, so it would never hit the cache).
+# A multi-target bundle gives a tuple with a value per target
+def make_predictor(bundle: Dict, predict_batch: Callable, cache_size: int = 4096) -> Callable[..., Union[float, Tuple]]:
+    @lru_cache(maxsize=cache_size)
+    def predict(country: str, year: int, early: Optional[float] = None,
+                exclusive: Optional[float] = None) -> Union[float, Tuple]:
+        early = math.nan if early is None else early
+        exclusive = math.nan if exclusive is None else exclusive
+        prediction = predict_batch(bundle, [country], [year], early, exclusive)[0]
+        return tuple(prediction.tolist()) if prediction.ndim else float(prediction)
+    return predict
+
+def make_handler(bundle: Dict, predict: Callable, predict_batch: Callable) -> type:
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def send_json(self, status: int, body: Dict):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/predict':
+                return self.send_json(404, {'error': 'unknown path, use /predict'})
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                early, exclusive = query.get('early'), query.get('exclusive')
+                prediction = predict(query['country'], int(query['year']),
+                                     None if early is None else float(early),
+                                     None if exclusive is None else float(exclusive))
+            except (KeyError, ValueError) as error:
+                return self.send_json(400, {'error': f'bad query: {error}'})
+            self.send_json(200, {'country': query['country'], 'year': int(query['year']),
+                                 'prediction': prediction, 'target': bundle['target']})
+
+        # Batches skip the LRU cache and go straight to one batch prediction
+        def do_POST(self):
+            if urlparse(self.path).path != '/predict':
+                return self.send_json(404, {'error': 'unknown path, use /predict'})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                predictions = predict_batch(bundle, body['countries'], body['years'],
+                                            body.get('early', math.nan), body.get('exclusive', math.nan),
+                                            body.get('override', False))
+            except (KeyError, ValueError, TypeError) as error:
+                return self.send_json(400, {'error': f'bad request: {error}'})
+            self.send_json(200, {'predictions': predictions.tolist(), 'target': bundle['target']})
+
+        def log_message(self, format, *args):
+            pass  # Keep the terminal quiet, one line per request adds up quickly
+
+    return PredictionHandler
+
+def main():
+    parser = argparse.ArgumentParser(description='Predict from a saved model bundle')
+    parser.add_argument('--bundle', default='model_bundle', help='folder written by NN_with_features.py --save-bundle')
+    parser.add_argument('--engine', choices=['auto', 'numpy', 'sklearn'], default='auto',
+                        help='auto uses the NumPy export when the bundle has one')
+    parser.add_argument('--cache-size', type=int, default=4096, help='number of predictions kept in the LRU cache')
+    commands = parser.add_subparsers(dest='command', required=True)
+    predict_parser = commands.add_parser('predict', help='print one prediction')
+    predict_parser.add_argument('country')
+    predict_parser.add_argument('year', type=int)
+    predict_parser.add_argument('--early', type=float, help='used if there is no data for that country-year')
+    predict_parser.add_argument('--exclusive', type=float, help='used if there is no data for that country-year')
+    serve_parser = commands.add_parser('serve', help='run the HTTP server')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    bundle, predict_batch = load_predictor(args.bundle, args.engine)
+    predict = make_predictor(bundle, predict_batch, args.cache_size)
+    if args.command == 'predict':
+        try:
+            prediction = predict(args.country, args.year, args.early, args.exclusive)
+        except KeyError as error:  # An unknown country, one line on stderr instead of a traceback
+            sys.exit(f'error: {error.args[0]}')
+        if isinstance(prediction, tuple):
+            for target, value in zip(bundle['target'], prediction):
+                print(f'{target}: {value:.2f}')
+        else:
+            print(f'{prediction:.2f}')
+        return
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(bundle, predict, predict_batch))
+    print(f'Serving predictions on http://{args.host}:{args.port}/predict')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
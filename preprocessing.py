@@ -0,0 +1,144 @@
+"""The preprocessing in front of the neural network as one fitted object, so it's fitted once on the
+training rows and then only applied with transform() (to the test rows, to new predictions, after
+being loaded back from a model bundle) instead of every caller refitting imputers and passing a
+scaler around. It holds:
+
+- the imputer: the training rows of every country, so a missing breastfeeding value in a new row
+  is filled by KNN from that country's rows like at fit time (see knn_imputation.py), plus a KNN
+  fallback over a sample of complete rows for countries it doesn't know
+- the scaler, fitted on the imputed training design matrix
+- the column layout: the numeric features and the country list, one-hot or sparse
+
+    preprocessor = Preprocessor(features, encoding='sparse')
+    X_train_scaled = preprocessor.fit_transform(X_train, y_train)
+    X_test_scaled = preprocessor.transform(X_test)
+
+X is the numeric features plus the 'Countries, territories and areas' column with country names.
+compact=True keeps everything in float32 and the country as a categorical (see compact_dtypes.py)."""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.impute import KNNImputer
+from sklearn.preprocessing import StandardScaler
+
+from country_encoding import COUNTRY_COL, country_codes, sparse_design_matrix
+from knn_imputation import COUNTRY_PREFIX, impute_by_group
+
+class Preprocessor(BaseEstimator, TransformerMixin):
+    def __init__(self, features: List[str], encoding: str = 'onehot', n_neighbors: int = 10, max_donors: int = 5000,
+                 seed: int = 50, compact: bool = False):
+        self.features = features
+        self.encoding = encoding
+        self.n_neighbors = n_neighbors
+        self.max_donors = max_donors
+        self.seed = seed
+        self.compact = compact
+
+    # Float type of the imputed values and the design matrix
+    @property
+    def dtype_(self):
+        return np.float32 if self.compact else np.float64
+
+    # One-hot column names in the order the model sees them (the numeric features come first)
+    @property
+    def columns_(self) -> List[str]:
+        if self.encoding == 'sparse':
+            return list(self.features) + [COUNTRY_COL]
+        return list(self.features) + [COUNTRY_PREFIX + country for country in self.categories_]
+
+    # Learn everything from the training rows and return them imputed, so fit_transform doesn't impute twice
+    def fit_impute(self, X: pd.DataFrame, y: pd.Series = None) -> pd.DataFrame:
+        if self.encoding not in ('onehot', 'sparse'):
+            raise ValueError(f"Unknown country encoding '{self.encoding}'")
+        self.categories_ = sorted(X[COUNTRY_COL].astype(str).unique())
+        codes = country_codes(X[COUNTRY_COL].astype(str), self.categories_)
+        values = X[self.features].to_numpy(dtype=self.dtype_)
+
+        # The raw training rows sorted by country, with where each country starts, are the KNN donors later on
+        order = np.argsort(codes, kind='stable')
+        self.donor_values_ = values[order]
+        self.donor_offsets_ = np.searchsorted(codes[order], np.arange(len(self.categories_) + 1))
+
+        imputed = impute_by_group(values, codes, self.n_neighbors, max_donors=self.max_donors, seed=self.seed,
+                                  dtype=self.dtype_)
+        complete = np.flatnonzero(~np.isnan(imputed).any(axis=1))
+        if len(complete) > self.max_donors:
+            complete = np.random.default_rng(self.seed).choice(complete, self.max_donors, replace=False)
+        self.fallback_ = KNNImputer(n_neighbors=self.n_neighbors).fit(imputed[complete])
+
+        # A single target is only ever imputed for training, with its training mean (what KNNImputer over the
+        # single target column worked out to). Several targets are never filled in, NN_with_features.py
+        # --all-targets trains on the rows that have all of them
+        self.target_fill_ = float(np.nanmean(y)) if isinstance(y, pd.Series) else np.nan
+
+        X_imputed = self._with_values(X, imputed)
+        if self.encoding == 'sparse':
+            self.scaler_ = StandardScaler().fit(X_imputed[self.features])
+        else:
+            self.scaler_ = StandardScaler().fit(self._one_hot_matrix(X_imputed))
+        return X_imputed
+
+    def fit(self, X: pd.DataFrame, y: pd.Series = None):
+        self.fit_impute(X, y)
+        return self
+
+    def fit_transform(self, X: pd.DataFrame, y: pd.Series = None, **fit_params):
+        return self.encode(self.fit_impute(X, y))
+
+    # Fill missing feature values, from the row's own country first and the fallback sample after that.
+    # Only the training rows are donors, so the rows being imputed never fill each other in
+    def impute(self, X: pd.DataFrame) -> pd.DataFrame:
+        values = X[self.features].to_numpy(dtype=self.dtype_, copy=True)
+        missing = np.isnan(values).any(axis=1)
+        if not missing.any():
+            return self._with_values(X, values)
+
+        codes = country_codes(X[COUNTRY_COL].astype(str), self.categories_)
+        for code in np.unique(codes[missing]):
+            if code < 0:
+                continue
+            rows = np.flatnonzero(missing & (codes == code))
+            donors = self.donor_values_[self.donor_offsets_[code]:self.donor_offsets_[code + 1]]
+            # Columns the country has no training value for are left to the fallback
+            observed = ~np.all(np.isnan(donors), axis=0)
+            if observed.any():
+                imputer = KNNImputer(n_neighbors=self.n_neighbors).fit(donors[:, observed])
+                block = values[rows]
+                block[:, observed] = imputer.transform(block[:, observed])
+                values[rows] = block
+        leftover = np.isnan(values).any(axis=1)
+        if leftover.any():
+            values[leftover] = self.fallback_.transform(values[leftover])
+        return self._with_values(X, values)
+
+    def impute_target(self, y: pd.Series) -> pd.Series:
+        return y.fillna(self.target_fill_).astype(self.dtype_)
+
+    # Scaled design matrix of rows that have no gaps any more
+    def encode(self, X_imputed: pd.DataFrame):
+        if self.encoding == 'sparse':
+            return sparse_design_matrix(X_imputed[self.features], X_imputed[COUNTRY_COL], self.categories_, self.scaler_,
+                                        self.dtype_)
+        return self.scaler_.transform(self._one_hot_matrix(X_imputed))
+
+    def transform(self, X: pd.DataFrame):
+        return self.encode(self.impute(X))
+
+    # The features with new values, keeping the country column
+    def _with_values(self, X: pd.DataFrame, values: np.ndarray) -> pd.DataFrame:
+        X_values = pd.DataFrame(values, columns=self.features, index=X.index)
+        countries = X[COUNTRY_COL].astype(str)
+        X_values[COUNTRY_COL] = countries.astype('category') if self.compact else countries.to_numpy()
+        return X_values
+
+    # The numeric features followed by dense one-hot country columns, like pd.get_dummies used to give
+    def _one_hot_matrix(self, X_imputed: pd.DataFrame) -> np.ndarray:
+        numeric = X_imputed[self.features].to_numpy(dtype=self.dtype_)
+        codes = country_codes(X_imputed[COUNTRY_COL], self.categories_)
+        one_hot = np.zeros((len(codes), len(self.categories_)), dtype=self.dtype_)
+        known = codes >= 0  # A country the model never saw just gets no country column
+        one_hot[np.flatnonzero(known), codes[known]] = 1
+        return np.hstack([numeric, one_hot])
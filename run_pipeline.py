@@ -0,0 +1,229 @@
+"""One entry point for the whole project instead of running the scripts by hand in the
+order listed in README.txt. The scripts are modelled as a dependency graph, a stage is
+only re-run if its script, one of the repo's modules it imports (e.g. preprocessing.py), one of
+its inputs or one of its outputs has changed since its last successful run, and stages that don't depend on each other (e.g. the visualisation
+scripts) run at the same time.
+
+Usage: python run_pipeline.py --data-dir ~/Desktop/AAI_2024_Datasets [--all] [--force] [--dry-run]"""
+
+import argparse
+import ast
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = '.pipeline_state.json'
+LOG_DIR = '.pipeline_logs'
+
+# Every stage is a script, the files it reads and writes (relative to the data folder, globs allowed)
+# and the stages that have to finish first. 'optional' stages only run with --all or when asked for,
+# 'args' are passed to the script (the visualisation scripts save their figures instead of showing them)
+STAGES = {
+    'merge_mortality_rates': {
+        'script': 'merge_mortality_rates.py', 'inputs': ['Child mortality rates_*.csv'],
+        'outputs': ['all_mortality_rates.parquet'], 'deps': []},
+    'merge_mortality_and_nutrition': {
+        'script': 'merge_mortality_and_nutrition.py',
+        'inputs': ['all_mortality_rates.parquet', 'Infant nutrition data by country.csv'],
+        'outputs': ['merged_data.csv'], 'deps': ['merge_mortality_rates']},
+    'hill_climbing': {
+        'script': 'hill_climbing.py', 'inputs': ['merged_data.csv'],
+        'outputs': ['cleaned_data.csv'], 'deps': ['merge_mortality_and_nutrition']},
+    'NN_with_features': {
+        'script': 'NN_with_features.py', 'inputs': ['cleaned_data.csv'],
+        'outputs': ['imputed_knn_data.csv'], 'deps': ['hill_climbing']},
+    'NN_no_features': {
+        'script': 'NN_no_features.py', 'inputs': ['cleaned_data.csv'],
+        'outputs': ['imputed_knn_data_no_features.csv'], 'deps': ['hill_climbing'], 'optional': True},
+    'all_countries_plotted_nutrition': {
+        'script': 'all_countries_plotted_nutrition.py', 'inputs': ['Infant nutrition data by country.csv'],
+        'outputs': ['figures/all_countries_plotted_nutrition/*.png'], 'deps': [], 'optional': True,
+        'args': ['--output-dir', 'figures/all_countries_plotted_nutrition']},
+    'Countries_clustered_with_subsections': {
+        'script': 'Countries_clustered_with_subsections.py', 'inputs': ['Infant nutrition data by country.csv'],
+        'outputs': ['figures/Countries_clustered_with_subsections/*.png'], 'deps': [], 'optional': True,
+        'args': ['--output-dir', 'figures/Countries_clustered_with_subsections']},
+    'error_bar_data_plotted': {
+        'script': 'error_bar_data_plotted.py', 'inputs': ['Infant nutrition data by country.csv'],
+        'outputs': ['figures/error_bar_data_plotted/*.png'], 'deps': [], 'optional': True,
+        'args': ['--output-dir', 'figures/error_bar_data_plotted']},
+    'economic_and_nutritional_plotted': {
+        'script': 'economic_and_nutritional_plotted.py', 'inputs': ['Infant nutrition data by country.csv'],
+        'outputs': ['figures/economic_and_nutritional_plotted/*.png'], 'deps': [], 'optional': True,
+        'args': ['--output-dir', 'figures/economic_and_nutritional_plotted']},
+}
+
+# Everything a list of stages needs, in an order where every stage comes after its dependencies
+def resolve_order(targets: List[str]) -> List[str]:
+    order, visiting = [], set()
+
+    def visit(name: str):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle at stage '{name}'")
+        if name not in STAGES:
+            raise KeyError(f"Unknown stage '{name}', choose from {', '.join(STAGES)}")
+        visiting.add(name)
+        for dep in STAGES[name]['deps']:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for target in targets:
+        visit(target)
+    return order
+
+# Hash a file, but only if its mtime or size moved since last time. The previous hashes are kept
+# in the state file so unchanged files are never re-read
+def file_hash(path: str, hash_cache: Dict[str, Dict]) -> str:
+    stat = os.stat(path)
+    cached = hash_cache.get(path)
+    if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        return cached['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    hash_cache[path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+# The repo's own modules a script imports, directly or through another one of them (imports inside
+# functions too). Read from the source with ast so nothing actually gets imported
+def local_modules(script: str) -> List[str]:
+    found, todo = set(), [script]
+    while todo:
+        with open(os.path.join(REPO_DIR, todo.pop())) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for module in names:
+                path = module.split('.')[0] + '.py'
+                if path != script and path not in found and os.path.exists(os.path.join(REPO_DIR, path)):
+                    found.add(path)
+                    todo.append(path)
+    return sorted(found)
+
+# Hashes of everything a stage depends on, None for a file that doesn't exist
+def stage_fingerprint(name: str, data_dir: str, hash_cache: Dict[str, Dict]) -> Dict[str, Optional[str]]:
+    stage = STAGES[name]
+    fingerprint = {'script': file_hash(os.path.join(REPO_DIR, stage['script']), hash_cache)}
+    for module in local_modules(stage['script']):
+        fingerprint[f'code:{module}'] = file_hash(os.path.join(REPO_DIR, module), hash_cache)
+    for kind in ('inputs', 'outputs'):
+        for pattern in stage[kind]:
+            matches = sorted(glob.glob(os.path.join(data_dir, pattern)))
+            if not matches:
+                fingerprint[f'{kind}:{pattern}'] = None
+            for path in matches:
+                fingerprint[f'{kind}:{os.path.relpath(path, data_dir)}'] = file_hash(path, hash_cache)
+    return fingerprint
+
+# Run one script inside the data folder, its output goes to a log file per stage
+def run_stage(name: str, data_dir: str) -> float:
+    start = time.perf_counter()
+    env = dict(os.environ, AAI_DATA_DIR=data_dir, MPLBACKEND=os.environ.get('MPLBACKEND', 'Agg'))
+    os.makedirs(os.path.join(data_dir, LOG_DIR), exist_ok=True)
+    with open(os.path.join(data_dir, LOG_DIR, f'{name}.log'), 'w') as log:
+        subprocess.run([sys.executable, os.path.join(REPO_DIR, STAGES[name]['script']), *STAGES[name].get('args', [])],
+                       cwd=data_dir, env=env, stdout=log, stderr=subprocess.STDOUT, check=True)
+    return time.perf_counter() - start
+
+# Run the stages, a stage is checked for changes once all of its dependencies are done so it
+# sees the outputs they just wrote. Returns True if nothing failed
+def run_pipeline(targets: List[str], data_dir: str, workers: int = 4, force: bool = False,
+                 dry_run: bool = False) -> bool:
+    data_dir = os.path.abspath(os.path.expanduser(data_dir))
+    state_path = os.path.join(data_dir, STATE_FILE)
+    state = {'stages': {}, 'hashes': {}}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+
+    order = resolve_order(targets)
+    pending, done, failed, running = list(order), set(), set(), {}
+    stale = set()  # Only used by --dry-run, stages that would have run
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name in list(pending):
+                deps = STAGES[name]['deps']
+                if any(dep in failed for dep in deps):
+                    print(f'[skip] {name}: a dependency failed')
+                    pending.remove(name)
+                    failed.add(name)
+                elif all(dep in done for dep in deps):
+                    pending.remove(name)
+                    fingerprint = stage_fingerprint(name, data_dir, state['hashes'])
+                    missing = [key for key, value in fingerprint.items() if value is None]
+                    # In a dry run nothing upstream actually re-ran, so assume its outputs would change
+                    upstream_stale = any(dep in stale for dep in deps)
+                    if not force and not missing and not upstream_stale and state['stages'].get(name) == fingerprint:
+                        print(f'[fresh] {name}')
+                        done.add(name)
+                    elif dry_run:
+                        print(f'[stale] {name}' + (f" (missing {', '.join(missing)})" if missing else ''))
+                        stale.add(name)
+                        done.add(name)
+                    else:
+                        print(f'[run] {name}')
+                        running[pool.submit(run_stage, name, data_dir)] = name
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    seconds = future.result()
+                except subprocess.CalledProcessError:
+                    print(f'[fail] {name}, see {os.path.join(data_dir, LOG_DIR, name + ".log")}')
+                    failed.add(name)
+                    continue
+                print(f'[done] {name} in {seconds:.1f}s')
+                state['stages'][name] = stage_fingerprint(name, data_dir, state['hashes'])
+                done.add(name)
+
+    if not dry_run:
+        with open(state_path, 'w') as f:
+            json.dump(state, f, indent=2)
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the pipeline, only re-running stages that are out of date')
+    parser.add_argument('stages', nargs='*', help='stages to bring up to date (default: the main chain)')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.expanduser('~'), 'Desktop/AAI_2024_Datasets'),
+                        help='folder with the WHO csv files, every output is written here too')
+    parser.add_argument('--all', action='store_true', help='include the optional and visualisation stages')
+    parser.add_argument('--workers', type=int, default=4, help='stages allowed to run at the same time')
+    parser.add_argument('--force', action='store_true', help='re-run every stage even if nothing changed')
+    parser.add_argument('--dry-run', action='store_true', help='only report which stages are out of date')
+    parser.add_argument('--profile', metavar='DIR', help='run the stages under cProfile and save the stats in DIR')
+    parser.add_argument('--trace-memory', action='store_true', help='record peak memory with tracemalloc (slower)')
+    args = parser.parse_args()
+
+    # The scripts pick these up through stage_telemetry.py, each stage appends its record to
+    # stage_telemetry.jsonl in the data folder
+    if args.profile:
+        os.environ['AAI_PROFILE'] = os.path.abspath(os.path.expanduser(args.profile))
+    if args.trace_memory:
+        os.environ['AAI_TRACE_MEMORY'] = '1'
+
+    targets = args.stages or [name for name, stage in STAGES.items() if args.all or not stage.get('optional')]
+    ok = run_pipeline(targets, args.data_dir, args.workers, args.force, args.dry_run)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Structured telemetry for the pipeline stages, so a slow or memory hungry run shows up in a
+log instead of needing the code to be instrumented by hand every time. Wrap a stage in
+stage_telemetry() and it appends one JSON record to stage_telemetry.jsonl with
+the wall time, CPU time, peak memory, rows in and out and NaN counts:
+
+    with stage_telemetry('hill_climbing') as telemetry:
+        cleaned_df = telemetry.output(align_data(telemetry.input(merged_df)))
+
+When a stage's result comes from the artifact cache its input is never read, so rows_in stays empty.
+
+Everything extra is opt-in through environment variables, which run_pipeline.py passes on:
+    AAI_TELEMETRY=path      where the records go (default stage_telemetry.jsonl, 'off' to disable)
+    AAI_TELEMETRY_ECHO=1    also print every record to stdout as it is written
+    AAI_TRACE_MEMORY=1      peak Python memory from tracemalloc (slows stages with lots of small objects)
+    AAI_PROFILE=folder      run the stage under cProfile, save <stage>.prof there (open it with
+                            pstats or snakeviz) and put the hottest functions in the record
+For py-spy, attach to the pid in the record or run: py-spy record -o profile.svg -- python hill_climbing.py"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource  # Not on Windows, the max RSS is just left out there
+except ImportError:
+    resource = None
+
+TELEMETRY_FILE = 'stage_telemetry.jsonl'
+HOT_FUNCTIONS = 15
+
+# Rows and NaNs of a frame/array, or of a list of them added together. Plain ints are taken as row counts
+def describe_data(data) -> Dict:
+    if data is None:
+        return {'rows': None, 'nans': None, 'nans_by_column': {}}
+    if isinstance(data, list):
+        parts = [describe_data(part) for part in data]
+        return {'rows': sum(part['rows'] or 0 for part in parts), 'nans': sum(part['nans'] or 0 for part in parts),
+                'nans_by_column': {}}
+    if isinstance(data, (int, np.integer)):
+        return {'rows': int(data), 'nans': None, 'nans_by_column': {}}
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if isinstance(data, pd.DataFrame):
+        counts = data.isna().sum()
+        return {'rows': len(data), 'nans': int(counts.sum()),
+                'nans_by_column': {str(column): int(count) for column, count in counts.items() if count}}
+    if hasattr(data, 'shape'):
+        values = data.data if hasattr(data, 'nnz') else np.asarray(data)  # Sparse: only the stored values
+        nans = int(np.isnan(values).sum()) if np.issubdtype(values.dtype, np.floating) else 0
+        return {'rows': data.shape[0], 'nans': nans, 'nans_by_column': {}}
+    return {'rows': len(data), 'nans': None, 'nans_by_column': {}}
+
+# Largest resident set size of this process and its finished child processes, in MB
+def max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 2)  # Bytes on macOS, KB on Linux
+
+# User + system CPU time, including worker processes that have been waited for (e.g. ProcessPoolExecutor)
+def cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+# The functions with the most time spent in them (not counting what they call)
+def hot_functions(profile: cProfile.Profile, limit: int = HOT_FUNCTIONS) -> List[Dict]:
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({'function': f'{os.path.basename(filename)}:{line}({name})', 'calls': calls,
+                     'tottime': round(tottime, 4), 'cumtime': round(cumtime, 4)})
+    rows.sort(key=lambda row: row['tottime'], reverse=True)
+    return rows[:limit]
+
+class StageTelemetry:
+    def __init__(self, stage: str, data_in=None):
+        self.record = {'stage': stage, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pid': os.getpid()}
+        self.data_in = describe_data(data_in)
+        self.data_out = describe_data(None)
+
+    # Pass the stage's input and result through these so their rows and NaNs get recorded
+    def input(self, data_in):
+        self.data_in = describe_data(data_in)
+        return data_in
+
+    def output(self, data_out):
+        self.data_out = describe_data(data_out)
+        return data_out
+
+    # Anything else worth keeping with the record, e.g. the settings the stage ran with
+    def note(self, **values) -> None:
+        self.record.update(values)
+
+def write_record(record: Dict, path: str) -> None:
+    line = json.dumps(record, default=str)
+    with open(path, 'a') as f:
+        f.write(line + '\n')
+    if os.environ.get('AAI_TELEMETRY_ECHO', '') not in ('', '0'):
+        print(line)
+
+# Time a stage and write its record when it finishes (also when it fails, with status 'error')
+@contextmanager
+def stage_telemetry(stage: str, data_in=None) -> Iterator[StageTelemetry]:
+    path = os.environ.get('AAI_TELEMETRY', TELEMETRY_FILE)
+    trace_memory = os.environ.get('AAI_TRACE_MEMORY', '') not in ('', '0')
+    profile_dir = os.environ.get('AAI_PROFILE')
+    telemetry = StageTelemetry(stage, data_in)
+
+    profile = cProfile.Profile() if profile_dir else None
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif trace_memory:
+        tracemalloc.reset_peak()  # Nested stage, measure from here
+    wall, cpu, status = time.perf_counter(), cpu_seconds(), 'ok'
+    if profile:
+        profile.enable()
+    try:
+        yield telemetry
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        if profile:
+            profile.disable()
+        record = telemetry.record
+        record.update({'status': status, 'wall_seconds': round(time.perf_counter() - wall, 4),
+                       'cpu_seconds': round(cpu_seconds() - cpu, 4), 'max_rss_mb': max_rss_mb(),
+                       'peak_traced_mb': None})
+        if trace_memory:
+            record['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+            if started_tracing:
+                tracemalloc.stop()
+        record.update({'rows_in': telemetry.data_in['rows'], 'rows_out': telemetry.data_out['rows'],
+                       'nan_in': telemetry.data_in['nans'], 'nan_out': telemetry.data_out['nans'],
+                       'nan_out_by_column': telemetry.data_out['nans_by_column']})
+        if profile:
+            os.makedirs(profile_dir, exist_ok=True)
+            profile_path = os.path.join(profile_dir, f'{stage}.prof')
+            profile.dump_stats(profile_path)
+            record.update({'profile': profile_path, 'hot_functions': hot_functions(profile)})
+        if path != 'off':
+            write_record(record, path)
@@ -0,0 +1,170 @@
+"""Out-of-core training of the neural network, for when the data doesn't fit in memory next to
+its imputed copy (e.g. sub-national or monthly data). train_neural_network() in NN_with_features.py
+calls MLPRegressor.fit on the whole scaled matrix at once, here the imputed data is read in chunks
+instead and the model only ever sees one block of rows at a time:
+
+1. one pass over the chunks fits the scaler (StandardScaler.partial_fit) and collects the countries
+2. every epoch streams the chunks again through a shuffle buffer (the files are sorted by country,
+   so without it each chunk would only teach the model a handful of countries) into partial_fit
+3. the held out rows are scored at the end of every epoch, also chunk by chunk, and training stops
+   once their MSE hasn't improved for --patience epochs
+
+Memory is bounded by about --chunk-rows + --buffer-rows rows whatever the size of the file. Which rows
+are held out only depends on the chunk they are in and --seed, so it's the same split every epoch.
+Reads the csv from NN_with_features.py or a parquet file (row groups are read one at a time).
+
+    python streaming_training.py --data imputed_knn_data.csv --epochs 100 --chunk-rows 50000"""
+
+import argparse
+import time
+import warnings
+from typing import Dict, Iterator, List, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.neural_network import MLPRegressor
+from sklearn.preprocessing import StandardScaler
+
+from country_encoding import COUNTRY_COL, sparse_design_matrix
+from NN_with_features import FEATURES, TARGET
+from stage_telemetry import stage_telemetry
+
+# Chunks of the imputed data with only the columns the model needs, rows with a gap are dropped
+def read_chunks(file_path: str, chunk_rows: int, dtype=np.float64) -> Iterator[pd.DataFrame]:
+    columns = FEATURES + [COUNTRY_COL, TARGET]
+    if file_path.endswith('.parquet'):
+        batches = (batch.to_pandas() for batch in pq.ParquetFile(file_path).iter_batches(chunk_rows, columns=columns))
+    else:
+        dtypes = {column: dtype for column in FEATURES + [TARGET]}
+        batches = pd.read_csv(file_path, usecols=columns, dtype=dtypes, chunksize=chunk_rows)
+    for chunk in batches:
+        chunk = chunk.dropna(subset=FEATURES + [TARGET])
+        chunk[COUNTRY_COL] = chunk[COUNTRY_COL].astype(str)
+        yield chunk
+
+# Which rows of a chunk are held out for testing, the same every time that chunk is read
+def holdout_mask(chunk_number: int, rows: int, holdout: float, seed: int) -> np.ndarray:
+    return np.random.default_rng([seed, chunk_number]).random(rows) < holdout
+
+# First pass: the scaler is fitted on the training rows one chunk at a time, and every country is collected
+def fit_scaler(file_path: str, chunk_rows: int, holdout: float, seed: int,
+               dtype=np.float64) -> Tuple[StandardScaler, List[str], int]:
+    scaler, countries, rows = StandardScaler(), set(), 0
+    for chunk_number, chunk in enumerate(read_chunks(file_path, chunk_rows, dtype)):
+        train = chunk[~holdout_mask(chunk_number, len(chunk), holdout, seed)]
+        if len(train):
+            scaler.partial_fit(train[FEATURES])
+        countries.update(chunk[COUNTRY_COL].unique())
+        rows += len(chunk)
+    return scaler, sorted(countries), rows
+
+# Training rows in shuffled blocks of up to chunk_rows. Rows collect in a buffer of buffer_rows and
+# anything over that is taken out at random, so rows from chunks far apart in the file get mixed
+def shuffled_blocks(file_path: str, chunk_rows: int, buffer_rows: int, holdout: float, seed: int,
+                    rng: np.random.Generator, dtype=np.float64) -> Iterator[pd.DataFrame]:
+    pool = None
+    for chunk_number, chunk in enumerate(read_chunks(file_path, chunk_rows, dtype)):
+        train = chunk[~holdout_mask(chunk_number, len(chunk), holdout, seed)]
+        pool = train if pool is None else pd.concat([pool, train], ignore_index=True)
+        if len(pool) <= buffer_rows:
+            continue
+        pool = pool.iloc[rng.permutation(len(pool))]
+        yield pool.iloc[:len(pool) - buffer_rows]
+        pool = pool.iloc[len(pool) - buffer_rows:]
+
+    # Whatever is left once the file runs out
+    if pool is not None and len(pool):
+        pool = pool.iloc[rng.permutation(len(pool))]
+        for start in range(0, len(pool), chunk_rows):
+            yield pool.iloc[start:start + chunk_rows]
+
+# MSE and R^2 over the held out rows, added up chunk by chunk
+def evaluate_streaming(model: MLPRegressor, file_path: str, scaler: StandardScaler, categories: List[str],
+                       chunk_rows: int, holdout: float, seed: int, dtype=np.float64) -> Dict:
+    n, squared_error, total, total_squares = 0, 0.0, 0.0, 0.0
+    for chunk_number, chunk in enumerate(read_chunks(file_path, chunk_rows, dtype)):
+        test = chunk[holdout_mask(chunk_number, len(chunk), holdout, seed)]
+        if not len(test):
+            continue
+        y = test[TARGET].to_numpy(np.float64)
+        predictions = model.predict(sparse_design_matrix(test[FEATURES], test[COUNTRY_COL], categories, scaler, dtype))
+        n += len(y)
+        squared_error += float(((y - predictions) ** 2).sum())
+        total += float(y.sum())
+        total_squares += float((y ** 2).sum())
+    if n == 0:
+        return {'n_test': 0, 'mse': None, 'r2': None}
+    variance = total_squares - total ** 2 / n
+    return {'n_test': n, 'mse': squared_error / n, 'r2': 1 - squared_error / variance if variance > 0 else None}
+
+# Train over the file for a number of epochs, scoring the held out rows after every epoch
+def train_streaming(file_path: str, epochs: int = 100, chunk_rows: int = 50000, buffer_rows: int = 100000,
+                    batch_rows: int = 200, hidden_layers: Tuple[int, ...] = (100, 50), holdout: float = 0.2,
+                    seed: int = 50, compact: bool = False,
+                    patience: int = 10) -> Tuple[MLPRegressor, StandardScaler, List[str], List[Dict]]:
+    dtype = np.float32 if compact else np.float64
+    with stage_telemetry('fit_streaming_scaler') as telemetry:
+        scaler, categories, rows = fit_scaler(file_path, chunk_rows, holdout, seed, dtype)
+        telemetry.note(rows=rows, countries=len(categories))
+
+    # Same network as train_neural_network, partial_fit does one shuffled pass of batch_rows mini-batches
+    # over whatever block it is given
+    model = MLPRegressor(hidden_layer_sizes=hidden_layers, batch_size=batch_rows, random_state=seed)
+    rng = np.random.default_rng(seed)
+    history, best_mse, stale_epochs = [], np.inf, 0
+    for epoch in range(1, epochs + 1):
+        start = time.perf_counter()
+        with stage_telemetry('train_streaming_epoch') as telemetry, warnings.catch_warnings():
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            for block in shuffled_blocks(file_path, chunk_rows, buffer_rows, holdout, seed, rng, dtype):
+                X = sparse_design_matrix(block[FEATURES], block[COUNTRY_COL], categories, scaler, dtype)
+                model.partial_fit(X, block[TARGET].to_numpy(dtype))
+            scores = evaluate_streaming(model, file_path, scaler, categories, chunk_rows, holdout, seed, dtype)
+            telemetry.note(epoch=epoch, **scores)
+        history.append({'epoch': epoch, 'seconds': time.perf_counter() - start, **scores})
+        if scores['mse'] is None:
+            # No chunk had any held out rows, so there's nothing to score or to stop early on
+            print(f"epoch {epoch:>3}  (no held out rows)  ({history[-1]['seconds']:.1f}s)")
+            continue
+        r2 = 'n/a' if scores['r2'] is None else f"{scores['r2']:.4f}"
+        print(f"epoch {epoch:>3}  MSE {scores['mse']:10.4f}  R^2 {r2}  ({history[-1]['seconds']:.1f}s)")
+
+        # Same tolerance as MLPRegressor's own stopping rule, but on the held out rows
+        if scores['mse'] < best_mse * (1 - 1e-4):
+            best_mse, stale_epochs = scores['mse'], 0
+        else:
+            stale_epochs += 1
+        if patience and stale_epochs >= patience:
+            print(f'Held out MSE has not improved for {patience} epochs, stopping')
+            break
+    return model, scaler, categories, history
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the neural network from chunks of the imputed data')
+    parser.add_argument('--data', default='imputed_knn_data.csv', help='imputed csv or parquet file')
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--patience', type=int, default=10,
+                        help='epochs without improvement before stopping, 0 to never stop early')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='rows read from the file at a time')
+    parser.add_argument('--buffer-rows', type=int, default=100000, help='rows kept for shuffling across chunks')
+    parser.add_argument('--batch-rows', type=int, default=200, help='mini-batch size of each partial_fit step')
+    parser.add_argument('--hidden-layers', type=int, nargs='+', default=[100, 50])
+    parser.add_argument('--holdout', type=float, default=0.2, help='share of the rows held out for testing')
+    parser.add_argument('--compact', action='store_true', help='float32 values (see compact_dtypes.py)')
+    parser.add_argument('--output', default='streamed_model.joblib', help='where the model and scaler are saved')
+    args = parser.parse_args()
+    if not 0 < args.holdout < 1:
+        parser.error('--holdout must be between 0 and 1, the held out rows are what every epoch is scored on')
+
+    model, scaler, categories, history = train_streaming(
+        args.data, args.epochs, args.chunk_rows, args.buffer_rows, args.batch_rows, tuple(args.hidden_layers),
+        args.holdout, compact=args.compact, patience=args.patience)
+    joblib.dump({'model': model, 'scaler': scaler, 'categories': categories, 'features': FEATURES,
+                 'target': TARGET, 'history': history}, args.output)
+    print(f'Model saved to {args.output}')
+
+if __name__ == "__main__":
+    main()